@@ -0,0 +1,59 @@
+import re
+import threading
+from collections import Counter
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9']+")
+MIN_LANGUAGETOOL_MATCHES = 2
+MIN_SUSPICIOUS_BIGRAMS = 1
+
+def tokenize(text):
+    return TOKEN_PATTERN.findall(text.lower())
+
+def bigrams(tokens):
+    return list(zip(["<s>"] + tokens, tokens + ["</s>"]))
+
+class BartGate:
+    # Decides per sentence whether BART refinement is worth running. The token-level
+    # classifier is a bigram set learned from the (wrong, right) dataset pairs: a
+    # bigram is suspicious when it was edited away more often than it was kept.
+    # get_pairs() returns a fresh iterable of the pairs and is read twice, so only the
+    # edited-away bigrams are ever counted, never every bigram of the corpus.
+    def __init__(self, get_pairs=None, min_languagetool_matches=MIN_LANGUAGETOOL_MATCHES,
+                 min_suspicious_bigrams=MIN_SUSPICIOUS_BIGRAMS):
+        self.min_languagetool_matches = min_languagetool_matches
+        self.min_suspicious_bigrams = min_suspicious_bigrams
+        self.suspicious = frozenset()
+        self.counters = Counter()
+        self.lock = threading.Lock()
+        if get_pairs is not None:
+            self.fit(get_pairs)
+
+    def fit(self, get_pairs):
+        removed = Counter()
+        for original, corrected in get_pairs():
+            if original != corrected:
+                removed.update(set(bigrams(tokenize(original))).difference(bigrams(tokenize(corrected))))
+        # Keeping only matters for bigrams that were also removed somewhere.
+        candidates = set(removed)
+        kept = Counter()
+        for _, corrected in get_pairs():
+            kept.update(candidates.intersection(bigrams(tokenize(corrected))))
+        self.suspicious = frozenset(bigram for bigram, count in removed.items() if count > kept[bigram])
+
+    def suspicious_bigrams(self, text):
+        return [bigram for bigram in bigrams(tokenize(text)) if bigram in self.suspicious]
+
+    def should_refine(self, text, languagetool_matches, regex_changed):
+        if languagetool_matches >= self.min_languagetool_matches:
+            return True, "model_languagetool"
+        if len(self.suspicious_bigrams(text)) >= self.min_suspicious_bigrams:
+            return True, "model_classifier"
+        return False, "rules" if languagetool_matches or regex_changed else "clean"
+
+    def record(self, tier, count=1):
+        with self.lock:
+            self.counters[tier] += count
+
+    def stats(self):
+        with self.lock:
+            return dict(self.counters)
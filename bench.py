@@ -0,0 +1,281 @@
+import os
+import re
+import sys
+import json
+import time
+import random
+import shutil
+import argparse
+import platform
+import tempfile
+import subprocess
+
+import v5
+from correction_store import CorrectionStore
+from regex_engine import RegexRuleSet
+from model_backend import BACKENDS
+from stubs import install_stubs
+
+SEED = 1234
+DATASET_SIZES = (1000, 100000, 1000000)
+RULE_COUNTS = (23, 2000)
+ITERATIONS = 2000
+MODEL_ITERATIONS = 20
+LOOKUP_HIT_RATIO = 0.8
+REGRESSION_THRESHOLD = 0.15  # relative p50/p95 slowdown that counts as a regression
+WORD = re.compile(r"[a-z']+")
+
+def base_pairs():
+    # The fixed corpus: the bundled dataset B file followed by the built-in dataset A pairs.
+    pairs = {}
+    if os.path.exists(v5.DATASET_B_FILE):
+        with open(v5.DATASET_B_FILE, "r", encoding='utf-8') as file:
+            pairs.update(json.load(file))
+    for original, corrected in v5.INITIAL_DATASET_A.items():
+        pairs.setdefault(original, corrected)
+    return sorted(pairs.items())
+
+def synthetic_pairs(base, count):
+    # Deterministic variants of the base pairs, numbered so that every key is distinct.
+    for index in range(count):
+        original, corrected = base[index % len(base)]
+        if index >= len(base):
+            original, corrected = f"{original} ({index})", f"{corrected} ({index})"
+        yield original, corrected
+
+def synthetic_rules(base, count):
+    # The handwritten rules, then identity rules built from the corpus bigrams so they
+    # match (and cost) like real rules without changing the text, then rules whose
+    # keyword never occurs.
+    rules = list(v5.load_regex_rules())[:count]
+    bigrams = sorted({
+        pair for original, _ in base
+        for pair in zip(WORD.findall(original), WORD.findall(original)[1:])
+    })
+    templates = (r"\b{0}\s+{1}\b", r"\b{0}\s+(\w+)\s+{1}\b", r"\b({0})\s+{1}s?\b")
+    for template in templates:
+        for first, second in bigrams:
+            if len(rules) >= count:
+                return rules
+            rules.append({"pattern": template.format(re.escape(first), re.escape(second)), "replacement": r"\g<0>"})
+    index = 0
+    while len(rules) < count:
+        rules.append({"pattern": rf"\bunmatched{index}\w*\b", "replacement": r"\g<0>"})
+        index += 1
+    return rules
+
+def percentile(sorted_values, fraction):
+    # Nearest-rank percentile of an already sorted list.
+    if not sorted_values:
+        return 0.0
+    rank = max(1, int(round(fraction * len(sorted_values) + 0.5)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+def measure(fn, inputs, iterations, warmup=None):
+    # Calls fn once per input, cycling through inputs, and returns latency statistics.
+    if warmup is None:
+        warmup = min(10, iterations // 10)
+    for index in range(warmup):
+        fn(inputs[index % len(inputs)])
+    latencies = []
+    start = time.perf_counter()
+    for index in range(iterations):
+        call_start = time.perf_counter()
+        fn(inputs[index % len(inputs)])
+        latencies.append(time.perf_counter() - call_start)
+    total = time.perf_counter() - start
+    latencies.sort()
+    return {
+        "iterations": iterations,
+        "throughput_per_sec": iterations / total if total else 0.0,
+        "mean_ms": sum(latencies) / len(latencies) * 1000,
+        "p50_ms": percentile(latencies, 0.50) * 1000,
+        "p95_ms": percentile(latencies, 0.95) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+        "max_ms": latencies[-1] * 1000,
+    }
+
+def isolate(workdir):
+    # Points v5 at copies of the datasets so benchmarking never writes to the real ones.
+    if os.path.exists(v5.DATASET_B_FILE):
+        shutil.copy(v5.DATASET_B_FILE, os.path.join(workdir, "dataset_b.json"))
+    v5.REGEX_RULES_FILE = os.path.abspath(v5.REGEX_RULES_FILE)
+    v5.MINED_RULES_FILE = os.path.abspath(v5.MINED_RULES_FILE)
+    v5.DATASET_A_FILE = os.path.join(workdir, "dataset_a.json")
+    v5.DATASET_B_FILE = os.path.join(workdir, "dataset_b.json")
+    v5.DATASET_B_JOURNAL_FILE = os.path.join(workdir, "dataset_b.log.jsonl")
+    v5.CORRECTION_INDEX_FILE = os.path.join(workdir, "index.sqlite3")
+    v5.FUZZY_LOOKUP_ENABLED = False
+    v5.INFERENCE_WORKERS = 0
+    v5.PROFILE_SLOW_REQUESTS_MS = None
+
+def bench_dataset_lookup(base, size, iterations, workdir, rng):
+    index_path = os.path.join(workdir, f"lookup-{size}.sqlite3")
+    start = time.perf_counter()
+    store = CorrectionStore(
+        [("dataset", (), lambda: synthetic_pairs(base, size))],
+        index_path=index_path,
+        cache_size=v5.CORRECTION_CACHE_SIZE,
+    )
+    build_seconds = time.perf_counter() - start
+    queries = []
+    for _ in range(iterations):
+        index = rng.randrange(size)
+        if rng.random() < LOOKUP_HIT_RATIO:
+            original, _ = base[index % len(base)]
+            queries.append(original if index < len(base) else f"{original} ({index})")
+        else:
+            queries.append(f"missing sentence number {index}")
+    try:
+        result = measure(store.get, queries, iterations)
+    finally:
+        store.close()
+    result["build_seconds"] = build_seconds
+    return result
+
+def bench_regex(base, rule_count, iterations):
+    rules = RegexRuleSet.from_rules(synthetic_rules(base, rule_count))
+    sentences = [original for original, _ in base]
+    result = measure(lambda sentence: v5.apply_regex_rules(sentence, rules), sentences, iterations)
+    result["rules"] = len(rules)
+    return result
+
+def bench_language_gate(base, iterations):
+    sentences = [original for original, _ in base]
+    return measure(v5.detect_language_warning, sentences, iterations)
+
+def bench_languagetool(base, iterations):
+    sentences = [original for original, _ in base]
+    v5.get_languagetool_pool()
+    return measure(v5.grammar_check_with_languagetool, sentences, iterations)
+
+def bench_bart(base, iterations):
+    sentences = [original for original, _ in base]
+    tokenizer, model = v5.get_bart_model()
+    return measure(lambda sentence: v5.refine_with_bart(tokenizer, model, sentence), sentences, iterations)
+
+def bench_end_to_end(base, iterations, hit):
+    # Misses are made unique per call so none of them is answered from dataset B after
+    # the first pass; hits are the bundled dataset sentences themselves.
+    if hit:
+        sentences = [original for original, _ in base]
+    else:
+        sentences = [f"{original} take {index}" for index, (original, _) in zip(range(iterations), synthetic_pairs(base, iterations))]
+    v5.get_correction_store()
+    v5.get_bart_gate()
+    return measure(v5.correct_sentence_structure, sentences, iterations, warmup=0 if not hit else None)
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def run(args):
+    rng = random.Random(args.seed)
+    base = base_pairs()
+    results = {}
+    workdir = tempfile.mkdtemp(prefix="egec-bench-")
+    selected = set(args.only or ())
+
+    def wanted(name):
+        return not selected or any(name.startswith(prefix) for prefix in selected)
+
+    def record(name, fn, *fn_args):
+        if not wanted(name):
+            return
+        print(f"{name} ...", file=sys.stderr)
+        try:
+            results[name] = fn(*fn_args)
+        except Exception as e:
+            print(f"{name} failed: {type(e).__name__}: {e}", file=sys.stderr)
+            results[name] = {"error": f"{type(e).__name__}: {e}"}
+            return
+        print(f"  p50 {results[name]['p50_ms']:.3f} ms, p95 {results[name]['p95_ms']:.3f} ms, "
+              f"{results[name]['throughput_per_sec']:.1f}/sec", file=sys.stderr)
+
+    try:
+        isolate(workdir)
+        v5.BART_BACKEND = args.bart_backend
+        if args.stub:
+            install_stubs()
+        for size in args.sizes:
+            record(f"dataset_lookup_{size}", bench_dataset_lookup, base, size, args.iterations, workdir, rng)
+        for rule_count in args.rules:
+            record(f"regex_{rule_count}_rules", bench_regex, base, rule_count, args.iterations)
+        record("language_gate", bench_language_gate, base, args.iterations)
+        record("languagetool", bench_languagetool, base, args.model_iterations)
+        record("bart", bench_bart, base, args.model_iterations)
+        record("end_to_end_hit", bench_end_to_end, base, args.iterations, True)
+        record("end_to_end_miss", bench_end_to_end, base, args.model_iterations, False)
+    finally:
+        v5.shutdown()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    return {
+        "meta": {
+            "revision": git_revision(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "stub": args.stub,
+            "bart_backend": args.bart_backend,
+            "seed": args.seed,
+            "corpus_pairs": len(base),
+        },
+        "results": results,
+    }
+
+def compare(baseline, current, threshold=REGRESSION_THRESHOLD):
+    # Prints the p50/p95 change of every benchmark present in both runs and returns the
+    # names of those that slowed down by more than threshold.
+    regressions = []
+    for name, result in current["results"].items():
+        previous = baseline["results"].get(name)
+        if previous is None or "error" in previous or "error" in result:
+            continue
+        changes = []
+        for metric in ("p50_ms", "p95_ms"):
+            change = (result[metric] - previous[metric]) / previous[metric] if previous[metric] else 0.0
+            changes.append(f"{metric} {previous[metric]:.3f} -> {result[metric]:.3f} ({change:+.0%})")
+            if change > threshold and name not in regressions:
+                regressions.append(name)
+        flag = "REGRESSION" if name in regressions else "ok"
+        print(f"{name:<28} {flag:<10} " + ", ".join(changes))
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the EGEC correction pipeline stages")
+    parser.add_argument("--output", metavar="FILE", help="write the JSON results here instead of stdout")
+    parser.add_argument("--compare", metavar="BASELINE", help="compare with an earlier results file; exit 1 on a regression")
+    parser.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD, help="relative p50/p95 slowdown treated as a regression")
+    parser.add_argument("--stub", action="store_true", help="replace langdetect, LanguageTool and BART with instant stubs (runs offline)")
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(DATASET_SIZES), help="dataset sizes for the lookup benchmark")
+    parser.add_argument("--rules", type=int, nargs="+", default=list(RULE_COUNTS), help="rule counts for the regex benchmark")
+    parser.add_argument("--iterations", type=int, default=ITERATIONS)
+    parser.add_argument("--model-iterations", type=int, default=MODEL_ITERATIONS, help="iterations for the LanguageTool, BART and end-to-end miss benchmarks")
+    parser.add_argument("--bart-backend", choices=BACKENDS, default=v5.BART_BACKEND)
+    parser.add_argument("--only", nargs="+", metavar="PREFIX", help="only run benchmarks whose name starts with one of these")
+    parser.add_argument("--seed", type=int, default=SEED)
+    args = parser.parse_args()
+
+    report = run(args)
+    text = json.dumps(report, indent=4)
+    if args.output:
+        with open(args.output, "w", encoding='utf-8') as file:
+            file.write(text + "\n")
+    else:
+        print(text)
+
+    if args.compare:
+        with open(args.compare, "r", encoding='utf-8') as file:
+            baseline = json.load(file)
+        regressions = compare(baseline, report, args.threshold)
+        if regressions:
+            print(f"Regressions: {', '.join(regressions)}", file=sys.stderr)
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
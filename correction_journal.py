@@ -0,0 +1,157 @@
+import os
+import json
+import queue
+import threading
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+    import msvcrt
+
+FLUSH_INTERVAL = 0.5
+FLUSH_BATCH_SIZE = 64
+COMPACT_THRESHOLD = 1000
+
+@contextmanager
+def locked_file(lock_path):
+    with open(lock_path, "a+b") as handle:
+        if fcntl:
+            fcntl.flock(handle.fileno(), fcntl.LOCK_EX)
+        else:
+            handle.seek(0)
+            msvcrt.locking(handle.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if fcntl:
+                fcntl.flock(handle.fileno(), fcntl.LOCK_UN)
+            else:
+                handle.seek(0)
+                msvcrt.locking(handle.fileno(), msvcrt.LK_UNLCK, 1)
+
+def read_journal(journal_path):
+    if not os.path.exists(journal_path):
+        return
+    with open(journal_path, "r", encoding='utf-8') as file:
+        for line in file:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                # A torn final line from a crashed writer; everything before it is intact.
+                continue
+            yield entry["original"], entry["corrected"]
+
+def merge_pairs(pairs, updates):
+    # Same result as updating a dict of `pairs` with `updates`: replaced pairs keep their
+    # position and new ones are appended in order.
+    for original, corrected in pairs:
+        yield original, updates.pop(original, corrected)
+    yield from updates.items()
+
+class CorrectionJournal:
+    # Appends learned corrections to a JSONL log from a background writer thread and
+    # periodically folds the log back into the main dataset file. load_fn() returns the
+    # main dataset's (original, corrected) pairs and save_fn(pairs) atomically writes
+    # them; compaction streams one into the other, so only the log's own entries are
+    # ever held in memory, however large the dataset grows. on_batch(pairs), if
+    # given, is also called on the writer thread with every batch, so callers can keep
+    # other stores up to date without waiting on disk themselves.
+    def __init__(self, journal_path, load_fn, save_fn, on_batch=None, flush_interval=FLUSH_INTERVAL,
+                 flush_batch_size=FLUSH_BATCH_SIZE, compact_threshold=COMPACT_THRESHOLD):
+        self.journal_path = journal_path
+        self.lock_path = journal_path + ".lock"
+        self.load_fn = load_fn
+        self.save_fn = save_fn
+        self.on_batch = on_batch
+        self.flush_interval = flush_interval
+        self.flush_batch_size = flush_batch_size
+        self.compact_threshold = compact_threshold
+        # Entries in the log as far as this process knows; compact() takes the exact count.
+        self.entry_count = sum(1 for _ in read_journal(journal_path))
+        self.pending = queue.Queue()
+        self.closed = threading.Event()
+        self.writer = threading.Thread(target=self._writer_loop, name="correction-journal", daemon=True)
+        self.writer.start()
+
+    def append(self, original, corrected):
+        self.pending.put((original, corrected))
+
+    def flush(self):
+        self.pending.join()
+
+    def close(self, compact=True):
+        self.flush()
+        self.closed.set()
+        self.writer.join()
+        if compact:
+            try:
+                self.compact(min_entries=1)
+            except Exception as e:
+                print(f"Correction journal compaction failed: {e}")
+
+    def _writer_loop(self):
+        while not (self.closed.is_set() and self.pending.empty()):
+            try:
+                batch = [self.pending.get(timeout=self.flush_interval)]
+            except queue.Empty:
+                continue
+            while len(batch) < self.flush_batch_size:
+                try:
+                    batch.append(self.pending.get_nowait())
+                except queue.Empty:
+                    break
+            # Any failure is logged and the batch still marked done, so the writer keeps
+            # running and flush() cannot block forever.
+            try:
+                self._write_batch(batch)
+            except Exception as e:
+                # Not handed to on_batch either: a batch that is not on disk would be
+                # served until the next restart and then lost.
+                print(f"Correction journal write failed: {e}")
+            else:
+                self._after_write(batch)
+            finally:
+                for _ in batch:
+                    self.pending.task_done()
+
+    def _after_write(self, batch):
+        try:
+            if self.on_batch is not None:
+                self.on_batch(batch)
+        except Exception as e:
+            print(f"Correction journal callback failed: {e}")
+        if self.entry_count >= self.compact_threshold:
+            try:
+                self.compact()
+            except Exception as e:
+                print(f"Correction journal compaction failed: {e}")
+
+    def _write_batch(self, batch):
+        lines = "".join(
+            json.dumps({"original": original, "corrected": corrected}, ensure_ascii=False) + "\n"
+            for original, corrected in batch
+        )
+        with locked_file(self.lock_path):
+            with open(self.journal_path, "a", encoding='utf-8') as file:
+                file.write(lines)
+                file.flush()
+                os.fsync(file.fileno())
+        self.entry_count += len(batch)
+
+    def compact(self, min_entries=None):
+        if min_entries is None:
+            min_entries = self.compact_threshold
+        with locked_file(self.lock_path):
+            entries = list(read_journal(self.journal_path))
+            # Another process may have compacted the log since this one last counted.
+            self.entry_count = len(entries)
+            if not entries or len(entries) < min_entries:
+                return 0
+            self.save_fn(merge_pairs(self.load_fn(), dict(entries)))
+            with open(self.journal_path, "w", encoding='utf-8') as file:
+                file.flush()
+                os.fsync(file.fileno())
+            self.entry_count = 0
+            return len(entries)
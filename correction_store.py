@@ -0,0 +1,214 @@
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+
+from fuzzy_index import FuzzyIndex, transfer_edit, SIMILARITY_THRESHOLD, TIME_BUDGET_MS
+
+INDEX_FILE = "correction_index.sqlite3"
+DEFAULT_CACHE_SIZE = 10000
+INSERT_BATCH_SIZE = 5000
+
+def normalize_key(text):
+    return " ".join(text.split()).lower()
+
+def file_fingerprint(paths):
+    parts = []
+    for path in paths:
+        try:
+            stat = os.stat(path)
+            parts.append(f"{path}:{stat.st_mtime_ns}:{stat.st_size}")
+        except FileNotFoundError:
+            parts.append(f"{path}:missing")
+    return "|".join(parts)
+
+class CorrectionStore:
+    # sources: ordered list of (name, paths, loader); earlier sources win on lookup.
+    # loader() returns a dict or an iterable of (original, corrected) pairs and is
+    # only called when the fingerprint of `paths` differs from the indexed one.
+    # Exact misses fall back to the fuzzy index once build_fuzzy_index() has run. A hit
+    # whose original is not exactly the query replays the stored pair's edit onto the
+    # query instead of returning the stored correction; fuzzy hits are reported with a
+    # "_fuzzy" suffix on the source name.
+    def __init__(self, sources, index_path=INDEX_FILE, cache_size=DEFAULT_CACHE_SIZE,
+                 fuzzy_threshold=SIMILARITY_THRESHOLD, fuzzy_time_budget_ms=TIME_BUDGET_MS):
+        self.sources = list(sources)
+        self.ranks = {name: rank for rank, (name, _, _) in enumerate(self.sources)}
+        self.index_path = index_path
+        self.cache_size = cache_size
+        self.cache = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.fuzzy_hits = 0
+        self.fuzzy_threshold = fuzzy_threshold
+        self.fuzzy_time_budget_ms = fuzzy_time_budget_ms
+        self.fuzzy_index = None
+        self.lock = threading.RLock()
+        self.conn = sqlite3.connect(index_path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS pairs ("
+            "key TEXT NOT NULL, rank INTEGER NOT NULL, source TEXT NOT NULL, "
+            "original TEXT NOT NULL, corrected TEXT NOT NULL, PRIMARY KEY (key, rank))"
+        )
+        self.conn.execute("CREATE TABLE IF NOT EXISTS sources (name TEXT PRIMARY KEY, fingerprint TEXT NOT NULL)")
+        self.conn.commit()
+        self.refresh()
+
+    def refresh(self):
+        with self.lock:
+            for name, paths, loader in self.sources:
+                fingerprint = file_fingerprint(paths)
+                row = self.conn.execute("SELECT fingerprint FROM sources WHERE name = ?", (name,)).fetchone()
+                if row and row[0] == fingerprint:
+                    continue
+                self._reindex_source(name, loader())
+                self.fuzzy_index = None
+                # The loader may have created the file, so take the fingerprint again.
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO sources (name, fingerprint) VALUES (?, ?)",
+                    (name, file_fingerprint(paths)),
+                )
+                self.conn.commit()
+            self.cache.clear()
+
+    def _reindex_source(self, name, pairs):
+        rank = self.ranks[name]
+        if isinstance(pairs, dict):
+            pairs = pairs.items()
+        self.conn.execute("DELETE FROM pairs WHERE rank = ?", (rank,))
+        batch = []
+        for original, corrected in pairs:
+            batch.append((normalize_key(original), rank, name, original, corrected))
+            if len(batch) >= INSERT_BATCH_SIZE:
+                self._insert_rows(batch)
+                batch = []
+        if batch:
+            self._insert_rows(batch)
+
+    def _insert_rows(self, rows):
+        self.conn.executemany(
+            "INSERT OR REPLACE INTO pairs (key, rank, source, original, corrected) VALUES (?, ?, ?, ?, ?)",
+            rows,
+        )
+
+    def get(self, text):
+        # The cache holds the matched (original, corrected, source) row per normalized
+        # key; the correction is fitted to the caller's exact text on every call.
+        key = normalize_key(text)
+        with self.lock:
+            cached = key in self.cache
+            if cached:
+                self.cache.move_to_end(key)
+                self.hits += 1
+                match = self.cache[key]
+            else:
+                match = self.conn.execute(
+                    "SELECT original, corrected, source FROM pairs WHERE key = ? ORDER BY rank LIMIT 1", (key,)
+                ).fetchone()
+                self.misses += 1
+        if not cached:
+            if match is None:
+                match = self._fuzzy_match(text)
+            with self.lock:
+                self._remember(key, match)
+        return self._fit(match, text)
+
+    def _fit(self, match, text):
+        if match is None:
+            return None, None
+        original, corrected, source = match
+        if text == original:
+            return corrected, source
+        # Differs in case or spacing (or is a fuzzy match): replay the edit on the input
+        # rather than handing back the stored sentence, which may lowercase the user's text.
+        corrected = transfer_edit(original, corrected, text)
+        if corrected is None:
+            return None, None
+        return corrected, source
+
+    def _fuzzy_match(self, text):
+        index = self.fuzzy_index
+        if index is None:
+            return None
+        rowid, _ = index.search(text)
+        if rowid is None:
+            return None
+        with self.lock:
+            row = self.conn.execute("SELECT original, corrected, source FROM pairs WHERE rowid = ?", (rowid,)).fetchone()
+        # The edit only transfers when its words line up with the query's.
+        if row is None or transfer_edit(row[0], row[1], text) is None:
+            return None
+        self.fuzzy_hits += 1
+        return row[0], row[1], f"{row[2]}_fuzzy"
+
+    def _fetch_originals(self, rowids):
+        placeholders = ",".join("?" * len(rowids))
+        with self.lock:
+            rows = self.conn.execute(
+                f"SELECT rowid, original FROM pairs WHERE rowid IN ({placeholders})", list(rowids)
+            ).fetchall()
+        return dict(rows)
+
+    def build_fuzzy_index(self):
+        index = FuzzyIndex(self._fetch_originals, self.fuzzy_threshold, self.fuzzy_time_budget_ms)
+        for rowid, original in self._iter_rows("original"):
+            index.add(rowid, original)
+        with self.lock:
+            self.fuzzy_index = index
+            # Cached misses may now have a fuzzy answer.
+            self.cache.clear()
+        return index
+
+    def put(self, source, original, corrected):
+        self.put_many(source, [(original, corrected)])
+
+    def put_many(self, source, pairs):
+        # One transaction for the whole batch.
+        rank = self.ranks[source]
+        rows = [(normalize_key(original), rank, source, original, corrected) for original, corrected in pairs]
+        with self.lock:
+            self._insert_rows(rows)
+            self.conn.commit()
+            for key, _, _, original, _ in rows:
+                self.cache.pop(key, None)
+                if self.fuzzy_index is not None:
+                    row = self.conn.execute("SELECT rowid FROM pairs WHERE key = ? AND rank = ?", (key, rank)).fetchone()
+                    self.fuzzy_index.add(row[0], original)
+
+    def iter_pairs(self):
+        for _, original, corrected in self._iter_rows("original, corrected"):
+            yield original, corrected
+
+    def _iter_rows(self, columns, chunk_size=INSERT_BATCH_SIZE):
+        # Pages through the index by rowid so large datasets never sit in memory at once.
+        last_rowid = 0
+        while True:
+            with self.lock:
+                rows = self.conn.execute(
+                    f"SELECT rowid, {columns} FROM pairs WHERE rowid > ? ORDER BY rowid LIMIT ?",
+                    (last_rowid, chunk_size),
+                ).fetchall()
+            if not rows:
+                return
+            yield from rows
+            last_rowid = rows[-1][0]
+
+    def _remember(self, key, result):
+        self.cache[key] = result
+        if len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+
+    def __len__(self):
+        with self.lock:
+            return self.conn.execute("SELECT COUNT(*) FROM pairs").fetchone()[0]
+
+    def stats(self):
+        with self.lock:
+            return {"entries": len(self), "cached": len(self.cache), "hits": self.hits, "misses": self.misses,
+                    "fuzzy_hits": self.fuzzy_hits, "fuzzy_indexed": len(self.fuzzy_index) if self.fuzzy_index else 0}
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
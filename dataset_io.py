@@ -0,0 +1,198 @@
+import os
+import sys
+import json
+import mmap
+import struct
+import hashlib
+
+from correction_store import normalize_key
+
+CHUNK_SIZE = 1024 * 1024
+CORPUS_MAGIC = b"EGEC1\x00\x00\x00"
+CORPUS_HEADER = struct.Struct("<8sQQQ")  # magic, count, reserved (0), end of the records
+RECORD_HEADER = struct.Struct("<II")  # original bytes, corrected bytes
+WHITESPACE = " \t\r\n"
+
+def key_hash(text):
+    digest = hashlib.blake2b(normalize_key(text).encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "little")
+
+def iter_json_object(file, chunk_size=CHUNK_SIZE):
+    # Yields the members of a top-level JSON object one at a time, keeping only the
+    # unparsed tail of the file in memory.
+    decoder = json.JSONDecoder()
+    buffer = ""
+    position = 0
+    eof = False
+
+    def fill():
+        nonlocal buffer, position, eof
+        chunk = file.read(chunk_size)
+        if not chunk:
+            eof = True
+        buffer = buffer[position:] + chunk
+        position = 0
+
+    def skip_whitespace():
+        nonlocal position
+        while True:
+            while position < len(buffer) and buffer[position] in WHITESPACE:
+                position += 1
+            if position < len(buffer) or eof:
+                return
+            fill()
+
+    def decode():
+        nonlocal position
+        while True:
+            try:
+                value, end = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                fill()
+                continue
+            # A value that runs to the end of the buffer (e.g. a number) may be cut short.
+            if end == len(buffer) and not eof:
+                fill()
+                continue
+            position = end
+            return value
+
+    def expect(character):
+        nonlocal position
+        skip_whitespace()
+        if position >= len(buffer) or buffer[position] != character:
+            raise ValueError(f"Expected '{character}' in JSON object stream")
+        position += 1
+
+    fill()
+    expect("{")
+    skip_whitespace()
+    if buffer[position:position + 1] == "}":
+        return
+    while True:
+        skip_whitespace()
+        key = decode()
+        expect(":")
+        skip_whitespace()
+        value = decode()
+        yield key, value
+        skip_whitespace()
+        if buffer[position:position + 1] == "}":
+            return
+        expect(",")
+
+def iter_jsonl(file):
+    for line in file:
+        if not line.strip():
+            continue
+        entry = json.loads(line)
+        if isinstance(entry, list):
+            yield entry[0], entry[1]
+        elif "original" in entry:
+            yield entry["original"], entry["corrected"]
+        else:
+            yield from entry.items()
+
+def iter_text_pairs(file_path, encoding):
+    with open(file_path, "r", encoding=encoding) as file:
+        if file_path.endswith(".jsonl"):
+            yield from iter_jsonl(file)
+        else:
+            yield from iter_json_object(file)
+
+def iter_pairs(file_path):
+    # Streams (original, corrected) pairs from a JSON object, JSONL or .egec corpus file.
+    if file_path.endswith(".egec"):
+        with CorpusFile(file_path) as corpus:
+            yield from corpus
+        return
+    produced = 0
+    try:
+        for pair in iter_text_pairs(file_path, "utf-8"):
+            yield pair
+            produced += 1
+    except UnicodeDecodeError:
+        # Same fallback as load_dataset; skip what was already produced before the bad byte.
+        for index, pair in enumerate(iter_text_pairs(file_path, "latin-1")):
+            if index >= produced:
+                yield pair
+
+def count_pairs(file_path):
+    # An .egec file keeps its count in the header; text files have to be read through.
+    if file_path.endswith(".egec"):
+        with CorpusFile(file_path) as corpus:
+            return len(corpus)
+    return sum(1 for _ in iter_pairs(file_path))
+
+def write_corpus(pairs, file_path):
+    count = 0
+    temp_path = file_path + ".tmp"
+    with open(temp_path, "wb") as file:
+        file.write(b"\x00" * CORPUS_HEADER.size)
+        offset = CORPUS_HEADER.size
+        for original, corrected in pairs:
+            original_bytes = original.encode("utf-8")
+            corrected_bytes = corrected.encode("utf-8")
+            file.write(RECORD_HEADER.pack(len(original_bytes), len(corrected_bytes)))
+            file.write(original_bytes)
+            file.write(corrected_bytes)
+            offset += RECORD_HEADER.size + len(original_bytes) + len(corrected_bytes)
+            count += 1
+        file.seek(0)
+        file.write(CORPUS_HEADER.pack(CORPUS_MAGIC, count, 0, offset))
+    os.replace(temp_path, file_path)
+    return count
+
+class CorpusFile:
+    # Memory-mapped .egec corpus of length-prefixed UTF-8 records. Opening only reads the
+    # header, so the pair count is known without touching the records. Lookups go
+    # through the CorrectionStore index, which the records are streamed into. Files
+    # written with the former trailing hash table still read: iteration stops at the
+    # end of the records.
+    def __init__(self, file_path):
+        self.file = open(file_path, "rb")
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.count, _, self.records_end = CORPUS_HEADER.unpack_from(self.map, 0)
+        if magic != CORPUS_MAGIC:
+            self.close()
+            raise ValueError(f"{file_path} is not an EGEC corpus file")
+
+    def _record(self, offset):
+        original_length, corrected_length = RECORD_HEADER.unpack_from(self.map, offset)
+        start = offset + RECORD_HEADER.size
+        middle = start + original_length
+        return (
+            self.map[start:middle].decode("utf-8"),
+            self.map[middle:middle + corrected_length].decode("utf-8"),
+            middle + corrected_length,
+        )
+
+    def __len__(self):
+        return self.count
+
+    def __iter__(self):
+        offset = CORPUS_HEADER.size
+        while offset < self.records_end:
+            original, corrected, offset = self._record(offset)
+            yield original, corrected
+
+    def close(self):
+        if getattr(self, "map", None) is not None:
+            self.map.close()
+            self.map = None
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3:
+        print("usage: python dataset_io.py INPUT(.json|.jsonl) OUTPUT.egec")
+        sys.exit(1)
+    count = write_corpus(iter_pairs(sys.argv[1]), sys.argv[2])
+    print(f"Wrote {count} pairs to {sys.argv[2]}")
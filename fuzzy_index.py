@@ -0,0 +1,140 @@
+import re
+import time
+import threading
+from array import array
+from difflib import SequenceMatcher
+
+NGRAM_SIZE = 3
+SIMILARITY_THRESHOLD = 0.85
+TIME_BUDGET_MS = 20
+MAX_POSTING_LENGTH = 20000
+MAX_QUERY_NGRAMS = 12
+MAX_CANDIDATES = 20
+PUNCTUATION = re.compile(r"[^\w\s']")
+
+def fuzzy_key(text):
+    # Stricter than the exact-match key: punctuation is dropped as well as case and spacing.
+    return " ".join(PUNCTUATION.sub(" ", text.lower()).split())
+
+def transfer_edit(original, corrected, text):
+    # Replays the word edits that turn original into corrected onto text, a sentence
+    # similar to original. Returns None when an edited word, or a word next to one, has
+    # no counterpart in text, because the edit may then not apply to it.
+    source, target, query = original.split(), corrected.split(), text.split()
+    lowered_source = [token.lower() for token in source]
+    aligned = {}
+    matcher = SequenceMatcher(None, lowered_source, [token.lower() for token in query], autojunk=False)
+    for block in matcher.get_matching_blocks():
+        for offset in range(block.size):
+            aligned[block.a + offset] = block.b + offset
+    replacements = []
+    matcher = SequenceMatcher(None, lowered_source, [token.lower() for token in target], autojunk=False)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == "equal":
+            continue
+        anchor = range(max(i1 - 1, 0), min(i2 + 1, len(source)))
+        positions = [aligned.get(index) for index in anchor]
+        if not positions or None in positions or positions[-1] - positions[0] != len(positions) - 1:
+            return None
+        start = positions[0] + i1 - anchor.start
+        replacements.append((start, start + i2 - i1, target[j1:j2]))
+    if replacements and replacements[0][0] == 0 and query[0][:1].isupper():
+        # The sentence now starts with a corrected word; move the capital onto it.
+        start, end, replacement = replacements[0]
+        if replacement:
+            replacements[0] = (start, end, [replacement[0][:1].upper() + replacement[0][1:], *replacement[1:]])
+            if end == 0 and query[0][1:].islower():
+                query[0] = query[0].lower()
+    tokens = []
+    position = 0
+    for start, end, replacement in replacements:
+        tokens.extend(query[position:start])
+        tokens.extend(replacement)
+        position = end
+    tokens.extend(query[position:])
+    return " ".join(tokens)
+
+def ngrams(key):
+    padded = f" {key} "
+    return {padded[start:start + NGRAM_SIZE] for start in range(len(padded) - NGRAM_SIZE + 1)}
+
+class FuzzyIndex:
+    # Character n-gram inverted index from fuzzy keys to integer ids. Queries count shared
+    # n-grams using the rarest query n-grams first, then rescore the best candidates with
+    # difflib. N-grams found in more than MAX_POSTING_LENGTH keys are too common to be
+    # useful: their postings are dropped (kept as None), which keeps a query bounded and
+    # saves most of the index's memory on very large datasets.
+    # fetch(ids) returns {id: text} for rescoring, so the index itself only holds ids.
+    def __init__(self, fetch, threshold=SIMILARITY_THRESHOLD, time_budget_ms=TIME_BUDGET_MS):
+        self.fetch = fetch
+        self.threshold = threshold
+        self.time_budget = time_budget_ms / 1000
+        self.postings = {}
+        self.size = 0
+        self.lock = threading.Lock()
+
+    def add(self, item_id, text):
+        key = fuzzy_key(text)
+        if not key:
+            return
+        with self.lock:
+            self.size += 1
+            for gram in ngrams(key):
+                if gram not in self.postings:
+                    self.postings[gram] = array("I")
+                posting = self.postings[gram]
+                if posting is None:
+                    continue
+                if len(posting) >= MAX_POSTING_LENGTH:
+                    self.postings[gram] = None
+                else:
+                    posting.append(item_id)
+
+    def __len__(self):
+        return self.size
+
+    def search(self, text):
+        # Returns (item_id, similarity) for the best key above the threshold, or (None, 0.0).
+        deadline = time.perf_counter() + self.time_budget
+        key = fuzzy_key(text)
+        if not key:
+            return None, 0.0
+        query_grams = ngrams(key)
+        with self.lock:
+            postings = sorted(
+                (posting for posting in (self.postings.get(gram) for gram in query_grams)
+                 if posting is not None),
+                key=len,
+            )[:MAX_QUERY_NGRAMS]
+            counts = {}
+            for posting in postings:
+                for item_id in posting:
+                    counts[item_id] = counts.get(item_id, 0) + 1
+                if time.perf_counter() > deadline:
+                    break
+            # Candidates need enough shared n-grams to possibly reach the threshold.
+            needed = max(1, int(len(postings) * self.threshold * 0.5))
+            candidates = sorted(
+                (item_id for item_id, count in counts.items() if count >= needed),
+                key=counts.get, reverse=True,
+            )[:MAX_CANDIDATES]
+
+        texts = self.fetch(candidates) if candidates else {}
+        best_id, best_score = None, 0.0
+        for item_id in candidates:
+            if item_id not in texts:
+                continue  # replaced or removed since it was indexed
+            candidate = fuzzy_key(texts[item_id])
+            if candidate == key:
+                return item_id, 1.0
+            matcher = SequenceMatcher(None, key, candidate, autojunk=False)
+            if matcher.real_quick_ratio() < self.threshold or matcher.quick_ratio() < self.threshold:
+                continue
+            score = matcher.ratio()
+            if score > best_score:
+                best_id, best_score = item_id, score
+            if time.perf_counter() > deadline:
+                break
+        if best_score >= self.threshold:
+            return best_id, best_score
+        return None, 0.0
@@ -0,0 +1,91 @@
+import os
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+WORKER_STATE = {}
+
+def default_threads_per_worker(workers):
+    return max(1, (os.cpu_count() or 1) // workers)
+
+def pin_threads(threads):
+    for variable in ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS"):
+        os.environ[variable] = str(threads)
+    try:
+        import torch
+    except ImportError:
+        return
+    torch.set_num_threads(threads)
+    try:
+        torch.set_num_interop_threads(1)
+    except RuntimeError:
+        # Only allowed before the first parallel work; a worker that already ran some keeps its value.
+        pass
+
+def init_worker(load_model, refine_fn, detect_fn, threads):
+    pin_threads(threads)
+    WORKER_STATE["refine_fn"] = refine_fn
+    WORKER_STATE["detect_fn"] = detect_fn
+    WORKER_STATE["model"] = load_model()
+
+def refine_task(texts, preset):
+    tokenizer, model = WORKER_STATE["model"]
+    return WORKER_STATE["refine_fn"](tokenizer, model, texts, preset)
+
+def detect_task(texts):
+    return [WORKER_STATE["detect_fn"](text) for text in texts]
+
+def ping_task(_=None):
+    return os.getpid()
+
+class InferencePool:
+    # Runs model inference in worker processes. load_model() returns (tokenizer, model),
+    # refine_fn(tokenizer, model, texts, preset) returns (results, batch_stats) and
+    # detect_fn(text) returns one result per text. Workers never fork from the caller,
+    # which may already be running threads that hold locks, so all three must be
+    # picklable (module-level functions or partials of them) and carry any settings the
+    # worker needs, since it starts from a fresh interpreter.
+    def __init__(self, workers, load_model, refine_fn, detect_fn, chunk_size, threads_per_worker=None,
+                 start_method=None):
+        if start_method is None:
+            start_method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+        self.workers = workers
+        self.chunk_size = chunk_size
+        self.start_method = start_method
+        self.threads_per_worker = threads_per_worker or default_threads_per_worker(workers)
+        self.executor = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context(start_method),
+            initializer=init_worker,
+            initargs=(load_model, refine_fn, detect_fn, self.threads_per_worker),
+        )
+
+    def warm_up(self):
+        # ProcessPoolExecutor starts workers lazily; make sure all of them have loaded.
+        return sorted(set(self.executor.map(ping_task, [None] * self.workers)))
+
+    def _chunks(self, texts, size):
+        return [texts[start:start + size] for start in range(0, len(texts), size)]
+
+    def refine(self, texts, preset=None):
+        # Sort by length before chunking so every worker gets similarly sized inputs.
+        order = sorted(range(len(texts)), key=lambda index: len(texts[index]))
+        chunks = self._chunks([texts[index] for index in order], self.chunk_size)
+        futures = [self.executor.submit(refine_task, chunk, preset) for chunk in chunks]
+        results = [None] * len(texts)
+        batch_stats = []
+        position = 0
+        for future in futures:
+            chunk_results, chunk_stats = future.result()
+            batch_stats.extend(chunk_stats)
+            for result in chunk_results:
+                results[order[position]] = result
+                position += 1
+        return results, batch_stats
+
+    def detect(self, texts):
+        size = max(1, -(-len(texts) // self.workers))
+        futures = [self.executor.submit(detect_task, chunk) for chunk in self._chunks(list(texts), size)]
+        return [result for future in futures for result in future.result()]
+
+    def close(self):
+        self.executor.shutdown(wait=True, cancel_futures=True)
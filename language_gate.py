@@ -0,0 +1,113 @@
+import re
+import threading
+from collections import OrderedDict
+
+from correction_store import normalize_key
+
+MEMO_SIZE = 10000
+MIN_COMMON_WORDS = 2
+MIN_COMMON_RATIO = 0.25
+WORD = re.compile(r"[a-z']+")
+# Function words that are not also common words in other Latin-script languages, so no
+# "a", "me", "he", "so", "do", "in", "to" or "is", which Romance, Germanic or Slavic text has too.
+COMMON_WORDS = frozenset({
+    "the", "and", "of", "that", "with", "this", "have", "are", "were", "what", "which",
+    "there", "their", "they", "them", "you", "your", "will", "would", "been", "not", "but",
+    "when", "how", "because", "very", "does", "did", "she", "him", "his", "said", "it",
+    "its", "our", "be", "should", "could", "about", "these", "those", "than", "then",
+})
+
+def is_probably_english(sentence):
+    # At least MIN_COMMON_WORDS different common words, making up MIN_COMMON_RATIO of the text.
+    words = WORD.findall(sentence.lower())
+    common = [word for word in words if word in COMMON_WORDS]
+    return len(set(common)) >= MIN_COMMON_WORDS and len(common) >= MIN_COMMON_RATIO * len(words)
+
+def load_langdetect():
+    # langdetect is randomized unless seeded; a fixed seed makes repeated checks agree.
+    from langdetect import DetectorFactory, LangDetectException, detect
+    DetectorFactory.seed = 0
+    detect("warm up the language profiles")
+
+    def detect_language(text):
+        try:
+            return detect(text)
+        except LangDetectException:
+            return None  # no usable features, e.g. only digits or punctuation
+
+    return detect_language
+
+class LanguageGate:
+    # Answers "is this English?" without a detector for ASCII text that contains common
+    # English words, and only sends the remaining texts to the (slow) detector. Results
+    # are memoized by normalized text. get_detector() returns detect(text) -> language
+    # code or None, and is only called on the slow path.
+    def __init__(self, get_detector, supported_language="en", memo_size=MEMO_SIZE):
+        self.get_detector = get_detector
+        self.supported_language = supported_language
+        self.memo_size = memo_size
+        self.memo = OrderedDict()
+        self.lock = threading.Lock()
+        self.fast_path = 0
+        self.memo_hits = 0
+        self.detections = 0
+
+    def detect(self, text):
+        return self.detect_many([text])[0]
+
+    def detect_many(self, texts, detect_batch=None):
+        # detect_batch(texts) -> languages, if given, replaces the detector for the texts
+        # that reach the slow path, e.g. to run them in worker processes.
+        languages = [None] * len(texts)
+        missing = {}
+        for index, text in enumerate(texts):
+            if text.isascii() and is_probably_english(text):
+                self.fast_path += 1
+                languages[index] = self.supported_language
+                continue
+            key = normalize_key(text)
+            with self.lock:
+                if key in self.memo:
+                    self.memo.move_to_end(key)
+                    self.memo_hits += 1
+                    languages[index] = self.memo[key]
+                    continue
+            missing.setdefault(key, (text, []))[1].append(index)
+        if not missing:
+            return languages
+        pending = list(missing.values())
+        if detect_batch is None:
+            detector = self.get_detector()
+            detected = [detector(text) for text, _ in pending]
+        else:
+            detected = detect_batch([text for text, _ in pending])
+        self.detections += len(pending)
+        with self.lock:
+            for key, (_, indexes), language in zip(missing, pending, detected):
+                self.memo[key] = language
+                for index in indexes:
+                    languages[index] = language
+            while len(self.memo) > self.memo_size:
+                self.memo.popitem(last=False)
+        return languages
+
+    def warning(self, text):
+        return self.warnings([text])[0]
+
+    def warnings(self, texts, detect_batch=None):
+        return [self._warning(text, language) for text, language in zip(texts, self.detect_many(texts, detect_batch))]
+
+    def _warning(self, text, language):
+        if language is None:
+            return "Could not detect language. Results may be inaccurate."
+        if language != self.supported_language and not is_probably_english(text):
+            return f"Detected language is not English ({language}). Results may be inaccurate."
+        return None
+
+    def stats(self):
+        return {
+            "fast_path": self.fast_path,
+            "memo_hits": self.memo_hits,
+            "detections": self.detections,
+            "memo_size": len(self.memo),
+        }
@@ -0,0 +1,184 @@
+import copy
+import asyncio
+import threading
+from bisect import bisect_right
+
+POOL_SIZE = 2
+CHECK_TIMEOUT = 30.0
+START_TIMEOUT = 120.0
+CHECK_RETRIES = 1
+MAX_REQUEST_CHARS = 20000
+SENTENCE_SEPARATOR = "\n\n"
+CONTEXT_CHARS = 40
+# Rules that look at neighbouring sentences, so their matches would depend on the batch.
+CROSS_SENTENCE_RULES = ("ENGLISH_WORD_REPEAT_BEGINNING_RULE", "PARAGRAPH_REPEAT_BEGINNING_RULE", "EN_REPEATEDWORDS")
+
+def _settle(future, result, error):
+    # The awaiting side may have given up on the call already.
+    if future.cancelled():
+        return
+    if error is not None:
+        future.set_exception(error)
+    else:
+        future.set_result(result)
+
+def localize_match(match, sentence, offset):
+    # A copy of match with its offset and context taken from sentence alone, so no text
+    # from the other sentences of the request leaks into the result.
+    local = copy.copy(match)
+    start = max(0, offset - CONTEXT_CHARS)
+    local.offset = offset
+    local.context = sentence[start:offset + match.errorLength + CONTEXT_CHARS]
+    local.offsetInContext = offset - start
+    return local
+
+class LanguageToolPool:
+    # N LanguageTool connections driven from a private asyncio loop. Each entry of
+    # `servers` is a remote server URL, or None to start a local server for that slot.
+    # Sentences are joined into as few check requests as MAX_REQUEST_CHARS allows and
+    # the match offsets are mapped back onto the individual sentences.
+    # Every blocking call runs on a daemon thread of its own. A check that times out may
+    # never return, so its thread is simply abandoned with the slot's tool; later calls
+    # and interpreter exit never wait on it.
+    def __init__(self, language='en-US', size=POOL_SIZE, servers=None, timeout=CHECK_TIMEOUT,
+                 retries=CHECK_RETRIES, max_request_chars=MAX_REQUEST_CHARS, start_timeout=START_TIMEOUT):
+        self.language = language
+        self.servers = list(servers) if servers else [None] * size
+        self.timeout = timeout
+        self.start_timeout = start_timeout
+        self.retries = retries
+        self.max_request_chars = max_request_chars
+        self.tools = [None] * len(self.servers)
+        self.restarts = 0
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, name="languagetool-pool", daemon=True)
+        self.thread.start()
+        self.idle = asyncio.run_coroutine_threadsafe(self._create_idle_queue(), self.loop).result()
+
+    async def _create_idle_queue(self):
+        idle = asyncio.Queue()
+        for slot in range(len(self.servers)):
+            idle.put_nowait(slot)
+        return idle
+
+    def _start_tool(self, slot):
+        import language_tool_python
+        tool = language_tool_python.LanguageTool(self.language, remote_server=self.servers[slot])
+        # requests otherwise waits up to five minutes on a server that stopped answering.
+        tool._TIMEOUT = self.timeout
+        return tool
+
+    def _close_tool(self, tool):
+        try:
+            tool.close()
+        except Exception as e:
+            print(f"LanguageTool shutdown failed: {e}")
+
+    def _retire(self, slot):
+        # Closing a wedged tool can block too, so it happens off the loop.
+        tool, self.tools[slot] = self.tools[slot], None
+        if tool is not None:
+            threading.Thread(target=self._close_tool, args=(tool,), name="languagetool-close", daemon=True).start()
+
+    async def _run(self, func, *args):
+        future = self.loop.create_future()
+
+        def call():
+            try:
+                result = func(*args)
+            except BaseException as e:
+                self.loop.call_soon_threadsafe(_settle, future, None, e)
+            else:
+                self.loop.call_soon_threadsafe(_settle, future, result, None)
+
+        threading.Thread(target=call, name="languagetool-call", daemon=True).start()
+        return await future
+
+    async def _start(self, slot):
+        await asyncio.wait_for(self._run(self._ensure_started, slot), self.start_timeout)
+
+    async def _check_text(self, text):
+        slot = await self.idle.get()
+        try:
+            for attempt in range(self.retries + 1):
+                try:
+                    await self._start(slot)
+                    return await asyncio.wait_for(self._run(self.tools[slot].check, text), self.timeout)
+                except Exception as e:
+                    print(f"LanguageTool check failed on slot {slot} ({type(e).__name__}: {e}), restarting")
+                    self.restarts += 1
+                    self._retire(slot)
+                    if attempt == self.retries:
+                        raise
+        finally:
+            self.idle.put_nowait(slot)
+
+    async def _start_all(self):
+        slots = [await self.idle.get() for _ in self.servers]
+        try:
+            await asyncio.gather(*(self._start(slot) for slot in slots))
+        finally:
+            for slot in slots:
+                self.idle.put_nowait(slot)
+
+    def _ensure_started(self, slot):
+        if self.tools[slot] is None:
+            tool = self._start_tool(slot)
+            # A start abandoned after its timeout can finish after the retry's start did.
+            if self.tools[slot] is None:
+                self.tools[slot] = tool
+            else:
+                self._close_tool(tool)
+
+    def warm_up(self):
+        asyncio.run_coroutine_threadsafe(self._start_all(), self.loop).result()
+
+    async def _check_group(self, sentences):
+        starts = []
+        position = 0
+        for sentence in sentences:
+            starts.append(position)
+            position += len(sentence) + len(SENTENCE_SEPARATOR)
+        matches = await self._check_text(SENTENCE_SEPARATOR.join(sentences))
+        per_sentence = [[] for _ in sentences]
+        for match in matches:
+            index = bisect_right(starts, match.offset) - 1
+            sentence = sentences[index]
+            offset = match.offset - starts[index]
+            # Matches that straddle the separator belong to no single sentence.
+            if offset + match.errorLength > len(sentence) or (match.ruleId or "").startswith(CROSS_SENTENCE_RULES):
+                continue
+            per_sentence[index].append(localize_match(match, sentence, offset))
+        return per_sentence
+
+    def _groups(self, sentences):
+        # Spread the batch over every slot, but never exceed max_request_chars per request.
+        total = sum(len(sentence) + len(SENTENCE_SEPARATOR) for sentence in sentences)
+        limit = min(self.max_request_chars, total // len(self.servers) + 1)
+        group, size = [], 0
+        for sentence in sentences:
+            if group and size + len(sentence) > limit:
+                yield group
+                group, size = [], 0
+            group.append(sentence)
+            size += len(sentence) + len(SENTENCE_SEPARATOR)
+        if group:
+            yield group
+
+    async def check_many(self, sentences):
+        groups = list(self._groups(sentences))
+        results = await asyncio.gather(*(self._check_group(group) for group in groups))
+        return [matches for group_matches in results for matches in group_matches]
+
+    def check_batch(self, sentences):
+        if not sentences:
+            return []
+        return asyncio.run_coroutine_threadsafe(self.check_many(list(sentences)), self.loop).result()
+
+    def close(self):
+        for slot, tool in enumerate(self.tools):
+            self.tools[slot] = None
+            if tool is not None:
+                self._close_tool(tool)
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
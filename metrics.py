@@ -0,0 +1,131 @@
+import os
+import time
+import pstats
+import cProfile
+import threading
+from contextlib import contextmanager
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+class StageTimer:
+    __slots__ = ("wall", "cpu", "_wall_start", "_cpu_start")
+
+    def __enter__(self):
+        self._wall_start = time.perf_counter()
+        self._cpu_start = time.thread_time()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.wall = time.perf_counter() - self._wall_start
+        self.cpu = time.thread_time() - self._cpu_start
+
+class Histogram:
+    __slots__ = ("buckets", "counts", "total", "count")
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        for position, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[position] += 1
+                break
+        self.total += value
+        self.count += 1
+
+def format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{value}"' for name, value in labels) + "}"
+
+class Metrics:
+    # Process-wide counters and latency histograms, rendered in the Prometheus text format.
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters = {}
+        self.histograms = {}
+        self.help = {}
+
+    def describe(self, name, text):
+        self.help[name] = text
+
+    def inc(self, name, amount=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+
+    def observe(self, name, value, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram()
+            histogram.observe(value)
+
+    def render_prometheus(self):
+        lines = []
+        with self.lock:
+            described = set()
+            for (name, labels), value in sorted(self.counters.items()):
+                if name not in described:
+                    described.add(name)
+                    if name in self.help:
+                        lines.append(f"# HELP {name} {self.help[name]}")
+                    lines.append(f"# TYPE {name} counter")
+                lines.append(f"{name}{format_labels(labels)} {value}")
+            for (name, labels), histogram in sorted(self.histograms.items()):
+                if name not in described:
+                    described.add(name)
+                    if name in self.help:
+                        lines.append(f"# HELP {name} {self.help[name]}")
+                    lines.append(f"# TYPE {name} histogram")
+                cumulative = 0
+                for bound, count in zip(histogram.buckets, histogram.counts):
+                    cumulative += count
+                    lines.append(f"{name}_bucket{format_labels(labels + (('le', bound),))} {cumulative}")
+                lines.append(f"{name}_bucket{format_labels(labels + (('le', '+Inf'),))} {histogram.count}")
+                lines.append(f"{name}_sum{format_labels(labels)} {histogram.total}")
+                lines.append(f"{name}_count{format_labels(labels)} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+class SlowRequestProfiler:
+    # Runs each profiled block under cProfile and keeps the trace only when the block took
+    # longer than threshold_ms. Traces are pstats files (snakeviz, `python -m pstats`).
+    # The profiled thread is renamed meanwhile so it stands out in py-spy dumps.
+    def __init__(self, threshold_ms, directory, on_slow=None):
+        self.threshold = threshold_ms / 1000
+        self.directory = directory
+        self.on_slow = on_slow
+        self.lock = threading.Lock()
+
+    @contextmanager
+    def profile(self, label):
+        # cProfile cannot nest across threads reliably, so concurrent blocks go unprofiled.
+        if not self.lock.acquire(blocking=False):
+            yield
+            return
+        thread = threading.current_thread()
+        original_name = thread.name
+        thread.name = f"egec-profiled:{label}"
+        profiler = cProfile.Profile()
+        start = time.perf_counter()
+        profiler.enable()
+        try:
+            yield
+        finally:
+            profiler.disable()
+            elapsed = time.perf_counter() - start
+            thread.name = original_name
+            self.lock.release()
+            if elapsed >= self.threshold:
+                self._save(profiler, label, elapsed)
+
+    def _save(self, profiler, label, elapsed):
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, f"slow-{time.strftime('%Y%m%d-%H%M%S')}-{int(elapsed * 1000)}ms.prof")
+        pstats.Stats(profiler).dump_stats(path)
+        if self.on_slow:
+            self.on_slow(label, elapsed, path)
@@ -0,0 +1,138 @@
+import os
+import sys
+import json
+import time
+import argparse
+from difflib import SequenceMatcher
+
+BACKENDS = ("eager", "int8", "onnx")
+CACHE_DIR = "model_cache"
+PARITY_BATCH_SIZE = 8
+PARITY_MAX_LENGTH = 128
+
+def cache_path(model_name, cache_dir=CACHE_DIR):
+    return os.path.join(cache_dir, model_name.replace("/", "--"))
+
+def load_seq2seq(model_name, backend="eager", cache_dir=CACHE_DIR):
+    # Returns (tokenizer, model) for a sequence-to-sequence model. The int8 and onnx
+    # backends are exported on first use and loaded from cache_dir afterwards. Every
+    # backend's model supports generate() with the same arguments as the eager one.
+    from transformers import AutoTokenizer
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown inference backend {backend!r}; expected one of {', '.join(BACKENDS)}")
+    tokenizer = AutoTokenizer.from_pretrained(model_name)
+    if backend == "int8":
+        model = load_int8(model_name, cache_dir)
+    elif backend == "onnx":
+        model = load_onnx(model_name, cache_dir)
+    else:
+        from transformers import AutoModelForSeq2SeqLM
+        model = AutoModelForSeq2SeqLM.from_pretrained(model_name)
+    return tokenizer, model
+
+def quantize(model):
+    import torch
+    return torch.quantization.quantize_dynamic(model.eval(), {torch.nn.Linear}, dtype=torch.qint8)
+
+def load_int8(model_name, cache_dir=CACHE_DIR):
+    # Dynamic int8 quantization of every Linear layer. The cache holds the quantized
+    # state dict; loading it builds the architecture from the config, so the fp32
+    # weights are never read again.
+    import torch
+    from transformers import AutoConfig, AutoModelForSeq2SeqLM, GenerationConfig
+    path = os.path.join(cache_path(model_name, cache_dir), "int8.pt")
+    if not os.path.exists(path):
+        model = quantize(AutoModelForSeq2SeqLM.from_pretrained(model_name))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        torch.save(model.state_dict(), path + ".tmp")
+        os.replace(path + ".tmp", path)
+        return model
+    model = quantize(AutoModelForSeq2SeqLM.from_config(AutoConfig.from_pretrained(model_name)))
+    # The cache is written by load_int8 itself; packed int8 weights are not plain tensors.
+    model.load_state_dict(torch.load(path, weights_only=False))
+    try:
+        model.generation_config = GenerationConfig.from_pretrained(model_name)
+    except OSError:
+        pass  # no generation_config.json; the defaults from the config apply
+    return model
+
+def load_onnx(model_name, cache_dir=CACHE_DIR):
+    # ONNX Runtime export with a separate decoder-with-past graph, so generation reuses
+    # the key/value cache instead of recomputing the whole prefix at every step.
+    from optimum.onnxruntime import ORTModelForSeq2SeqLM
+    path = os.path.join(cache_path(model_name, cache_dir), "onnx")
+    if not os.path.isdir(path):
+        model = ORTModelForSeq2SeqLM.from_pretrained(model_name, export=True, use_cache=True)
+        model.save_pretrained(path + ".tmp")
+        os.replace(path + ".tmp", path)
+    return ORTModelForSeq2SeqLM.from_pretrained(path, use_cache=True, provider="CPUExecutionProvider")
+
+def generate(tokenizer, model, texts, batch_size=PARITY_BATCH_SIZE, max_length=PARITY_MAX_LENGTH, **options):
+    outputs = []
+    for start in range(0, len(texts), batch_size):
+        inputs = tokenizer(texts[start:start + batch_size], return_tensors="pt", padding=True, truncation=True, max_length=512)
+        ids = model.generate(**inputs, max_length=max_length, **options)
+        outputs.extend(tokenizer.batch_decode(ids, skip_special_tokens=True))
+    return outputs
+
+def parity_corpus(paths):
+    # The bundled datasets: the given files followed by the built-in dataset A pairs.
+    from dataset_io import iter_pairs
+    from v5 import INITIAL_DATASET_A
+    texts = []
+    for path in paths:
+        if os.path.exists(path):
+            texts.extend(original for original, _ in iter_pairs(path))
+    texts.extend(INITIAL_DATASET_A)
+    return list(dict.fromkeys(texts))
+
+def timed_generate(model_name, backend, texts, cache_dir, batch_size, options):
+    start = time.perf_counter()
+    tokenizer, model = load_seq2seq(model_name, backend, cache_dir)
+    load_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    outputs = generate(tokenizer, model, texts, batch_size, **options)
+    return outputs, load_seconds, time.perf_counter() - start
+
+def check_parity(model_name, backend, texts, cache_dir=CACHE_DIR, batch_size=PARITY_BATCH_SIZE, **options):
+    # Generates with the eager model and with `backend` and reports how often they agree.
+    reference, eager_load, eager_seconds = timed_generate(model_name, "eager", texts, cache_dir, batch_size, options)
+    candidate, backend_load, backend_seconds = timed_generate(model_name, backend, texts, cache_dir, batch_size, options)
+    similarities = [SequenceMatcher(None, a, b).ratio() for a, b in zip(reference, candidate)]
+    mismatches = [
+        {"input": text, "eager": a, backend: b}
+        for text, a, b in zip(texts, reference, candidate) if a != b
+    ]
+    return {
+        "model": model_name,
+        "backend": backend,
+        "texts": len(texts),
+        "exact_match": 1 - len(mismatches) / len(texts) if texts else 1.0,
+        "mean_similarity": sum(similarities) / len(similarities) if similarities else 1.0,
+        "eager_load_seconds": eager_load,
+        "backend_load_seconds": backend_load,
+        "eager_seconds": eager_seconds,
+        "backend_seconds": backend_seconds,
+        "speedup": eager_seconds / backend_seconds if backend_seconds else 0.0,
+        "mismatches": mismatches,
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare an exported inference backend with the eager model")
+    parser.add_argument("--model", default="facebook/bart-large-cnn")
+    parser.add_argument("--backend", choices=[backend for backend in BACKENDS if backend != "eager"], default="int8")
+    parser.add_argument("--dataset", nargs="+", default=["text_correction_dataset.json", "lang8_corrected_pairs.json"])
+    parser.add_argument("--prefix", default="", help="prepended to every input, e.g. 'grammar: ' for the T5 corrector")
+    parser.add_argument("--limit", type=int, help="only use the first N sentences")
+    parser.add_argument("--num-beams", type=int, default=5)
+    parser.add_argument("--batch-size", type=int, default=PARITY_BATCH_SIZE)
+    parser.add_argument("--cache-dir", default=CACHE_DIR)
+    parser.add_argument("--min-exact-match", type=float, help="exit 1 when fewer outputs than this fraction are identical")
+    args = parser.parse_args()
+
+    texts = [args.prefix + text for text in parity_corpus(args.dataset)][:args.limit]
+    report = check_parity(args.model, args.backend, texts, args.cache_dir, args.batch_size,
+                          num_beams=args.num_beams, early_stopping=args.num_beams > 1)
+    print(json.dumps(report, indent=4, ensure_ascii=False))
+    if args.min_exact_match is not None and report["exact_match"] < args.min_exact_match:
+        sys.exit(1)
@@ -1,7 +1,101 @@
+import os
 import json
+import time
+import argparse
+import threading
 import tkinter as tk
 from tkinter import filedialog
 from transformers import pipeline
+from dataset_io import count_pairs, iter_pairs
+from model_backend import BACKENDS, load_seq2seq
+
+MODEL_NAME = 'vennify/t5-base-grammar-correction'
+BATCH_SIZE = 16
+MAX_LENGTH = 128
+BACKEND = 'eager'  # or 'int8' / 'onnx', see model_backend.py
+
+def load_corrector():
+    tokenizer, model = load_seq2seq(MODEL_NAME, BACKEND)
+    return pipeline(
+        'text2text-generation',
+        model=model,
+        tokenizer=tokenizer,
+        max_length=MAX_LENGTH
+    )
+
+def refined_path(file_path):
+    return os.path.splitext(file_path)[0] + '_refined.json'
+
+class BulkRefiner:
+    # Refines every entry whose correction is still the original text, in batches.
+    # Each finished batch is appended to a JSONL checkpoint next to the output file,
+    # so an interrupted run resumes where it stopped instead of starting over.
+    def __init__(self, input_path, output_path=None, corrector=None, batch_size=BATCH_SIZE, progress=None):
+        self.input_path = input_path
+        self.output_path = output_path or refined_path(input_path)
+        self.checkpoint_path = self.output_path + ".checkpoint.jsonl"
+        self.corrector = corrector
+        self.batch_size = batch_size
+        self.progress = progress or (lambda done, total, refined: None)
+
+    def load_checkpoint(self):
+        refined = {}
+        if os.path.exists(self.checkpoint_path):
+            with open(self.checkpoint_path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue  # torn last line from an interrupted run
+                    refined[entry["original"]] = entry["corrected"]
+        return refined
+
+    def run(self):
+        refined = self.load_checkpoint()
+        # Only the unresolved originals are kept; the file is streamed again for the output.
+        unresolved = [original for original, corrected in iter_pairs(self.input_path) if original == corrected]
+        total = len(unresolved)
+        pending = [original for original in unresolved if original not in refined]
+        done = total - len(pending)
+        self.progress(done, total, len(refined))
+
+        if pending and self.corrector is None:
+            self.corrector = load_corrector()
+        with open(self.checkpoint_path, 'a', encoding='utf-8') as checkpoint:
+            for start in range(0, len(pending), self.batch_size):
+                batch = pending[start:start + self.batch_size]
+                results = self.corrector(
+                    [f"grammar: {original}" for original in batch],  # Special prompt format the model expects
+                    max_length=MAX_LENGTH,
+                    num_beams=5,
+                    early_stopping=True,
+                    batch_size=len(batch)
+                )
+                for original, result in zip(batch, results):
+                    if isinstance(result, list):
+                        result = result[0]
+                    refined[original] = result['generated_text'].strip()
+                    checkpoint.write(json.dumps({"original": original, "corrected": refined[original]}) + "\n")
+                checkpoint.flush()
+                os.fsync(checkpoint.fileno())
+                done += len(batch)
+                self.progress(done, total, len(refined))
+
+        self.write_output(refined)
+        os.remove(self.checkpoint_path)
+        return len(refined)
+
+    def write_output(self, refined):
+        temp_path = self.output_path + ".tmp"
+        with open(temp_path, 'w') as f:
+            f.write("{")
+            count = 0
+            for original, corrected in iter_pairs(self.input_path):
+                corrected = refined.get(original, corrected)
+                f.write(("," if count else "") + f"\n    {json.dumps(original)}: {json.dumps(corrected)}")
+                count += 1
+            f.write("\n}" if count else "}")
+        os.replace(temp_path, self.output_path)
 
 class GrammarCorrectorApp:
     def __init__(self, root):
@@ -19,73 +113,90 @@ class GrammarCorrectorApp:
         self.status_label.pack(pady=10)
         
         # Initialize variables
-        self.data = None
+        self.entry_count = 0
         self.file_path = ""
         self.corrector = None
+        self.refiner = None
 
     def load_json(self):
-        self.file_path = filedialog.askopenfilename(filetypes=[("JSON files", "*.json")])
+        self.file_path = filedialog.askopenfilename(filetypes=[("JSON files", "*.json"), ("JSON Lines files", "*.jsonl"), ("EGEC corpus files", "*.egec")])
         if self.file_path:
-            try:
-                with open(self.file_path, 'r') as f:
-                    self.data = json.load(f)
-                self.refine_btn.config(state=tk.NORMAL)
-                self.status_label.config(text=f"Loaded: {self.file_path}")
-            except Exception as e:
-                self.status_label.config(text=f"Error loading file: {str(e)}")
+            self.entry_count = 0
+            self.status_label.config(text=f"Counting entries in {self.file_path}...")
+            self.refine_btn.config(state=tk.DISABLED)
+            self.load_btn.config(state=tk.DISABLED)
+            # A large JSON file takes a while to read through, so count off the Tk thread.
+            threading.Thread(target=self._count_thread, args=(self.file_path,), daemon=True).start()
+
+    def _count_thread(self, file_path):
+        try:
+            count = count_pairs(file_path)
+            self.root.after(0, lambda: self._loaded(file_path, count))
+        except Exception as e:
+            error = f"Error loading file: {str(e)}"
+            self.root.after(0, lambda: self._loaded(file_path, 0, error))
+
+    def _loaded(self, file_path, count, error=None):
+        self.load_btn.config(state=tk.NORMAL)
+        self.entry_count = count
+        if error:
+            self.status_label.config(text=error)
+            return
+        self.refine_btn.config(state=tk.NORMAL)
+        self.status_label.config(text=f"Loaded: {file_path} ({count} entries)")
 
     def refine_data(self):
-        if not self.data:
+        if not self.entry_count:
             return
 
+        self.status_label.config(text="Initializing Grammar Correction model...")
+        self.refine_btn.config(state=tk.DISABLED)
+        self.load_btn.config(state=tk.DISABLED)
+        self.refiner = BulkRefiner(self.file_path, corrector=self.corrector, progress=self.report_progress)
+        threading.Thread(target=self._refine_thread, daemon=True).start()
+
+    def report_progress(self, done, total, refined):
+        self.root.after(0, lambda: self.status_label.config(text=f"Processing {done}/{total} entries needing correction"))
+
+    def _refine_thread(self):
         try:
-            self.status_label.config(text="Initializing Grammar Correction model...")
-            self.root.update()
-            
-            # Initialize T5 grammar correction pipeline
-            self.corrector = pipeline(
-                'text2text-generation',
-                model='vennify/t5-base-grammar-correction',
-                max_length=128
-            )
-            
-            corrected_count = 0
-            total_entries = len(self.data)
-            
-            for idx, (original, corrected) in enumerate(self.data.copy().items()):
-                # Update status
-                self.status_label.config(text=f"Processing {idx+1}/{total_entries}: {original}")
-                self.root.update()
-                
-                # Only process entries needing correction (original == corrected)
-                if original == corrected:
-                    # Generate correction using T5 model
-                    result = self.corrector(
-                        f"grammar: {original}",  # Special prompt format the model expects
-                        max_length=128,
-                        num_beams=5,
-                        early_stopping=True
-                    )
-                    
-                    # Extract corrected sentence
-                    new_corrected = result[0]['generated_text'].strip()
-                    
-                    # Update data
-                    self.data[original] = new_corrected
-                    corrected_count += 1
-            
-            # Save refined data
-            save_path = self.file_path.replace('.json', '_refined.json')
-            with open(save_path, 'w') as f:
-                json.dump(self.data, f, indent=4)
-            
-            self.status_label.config(text=f"Refined {corrected_count} entries. Saved to:\n{save_path}")
-            self.refine_btn.config(state=tk.DISABLED)
-            
+            corrected_count = self.refiner.run()
+            self.corrector = self.refiner.corrector
+            save_path = self.refiner.output_path
+            self.root.after(0, lambda: self.status_label.config(text=f"Refined {corrected_count} entries. Saved to:\n{save_path}"))
         except Exception as e:
-            self.status_label.config(text=f"Error during processing: {str(e)}")
+            self.root.after(0, lambda: self.status_label.config(text=f"Error during processing: {str(e)}"))
+            self.root.after(0, lambda: self.refine_btn.config(state=tk.NORMAL))
+        finally:
+            self.root.after(0, lambda: self.load_btn.config(state=tk.NORMAL))
+
+def run_headless(input_path, output_path=None, batch_size=BATCH_SIZE):
+    start = time.perf_counter()
+
+    def report(done, total, refined):
+        elapsed = time.perf_counter() - start
+        print(f"{done}/{total} entries refined ({elapsed:.0f}s elapsed)", flush=True)
+
+    refiner = BulkRefiner(input_path, output_path, batch_size=batch_size, progress=report)
+    try:
+        corrected_count = refiner.run()
+    except KeyboardInterrupt:
+        print(f"Interrupted; progress is kept in {refiner.checkpoint_path}")
+        return
+    print(f"Refined {corrected_count} entries. Saved to: {refiner.output_path}")
 
 if __name__ == "__main__":
-    root = tk.Tk()
-    app = GrammarCorrectorApp(root)
-    root.mainloop()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Grammar Correction Refiner")
+    parser.add_argument("--headless", metavar="INPUT", help="refine a JSON file without the GUI; rerun to resume")
+    parser.add_argument("--output", metavar="OUTPUT", help="defaults to <input>_refined.json")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--backend", choices=BACKENDS, default=BACKEND, help="eager PyTorch, int8 dynamic quantization or ONNX Runtime")
+    args = parser.parse_args()
+    BACKEND = args.backend
+
+    if args.headless:
+        run_headless(args.headless, args.output, args.batch_size)
+    else:
+        root = tk.Tk()
+        app = GrammarCorrectorApp(root)
+        root.mainloop()
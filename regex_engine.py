@@ -0,0 +1,161 @@
+import os
+import re
+import time
+import threading
+
+try:
+    from re import _parser as sre_parse
+except ImportError:
+    import sre_parse
+
+RELOAD_CHECK_INTERVAL = 1.0
+MIN_KEYWORD_LENGTH = 2
+
+def required_literals(pattern):
+    # Literal runs that every match of `pattern` must contain. Anything optional,
+    # repeated or alternated ends the current run, so the result is conservative.
+    try:
+        parsed = sre_parse.parse(pattern, re.IGNORECASE)
+    except re.error:
+        return []
+    runs = []
+    current = []
+
+    def walk(items):
+        for op, av in items:
+            if op is sre_parse.LITERAL:
+                current.append(chr(av))
+            elif op is sre_parse.SUBPATTERN:
+                walk(av[-1])
+            elif op is sre_parse.AT:
+                continue
+            else:
+                if current:
+                    runs.append("".join(current))
+                    current.clear()
+
+    walk(parsed)
+    if current:
+        runs.append("".join(current))
+    return [run.lower() for run in runs]
+
+def pick_keyword(pattern):
+    literals = [literal for literal in required_literals(pattern) if len(literal.strip()) >= MIN_KEYWORD_LENGTH]
+    if not literals:
+        return None
+    return max(literals, key=len)
+
+def case_preserving(template):
+    # A replacement function that expands `template` and, when the matched text starts
+    # with a capital, capitalizes the result too.
+    def replace(match):
+        text = match.expand(template)
+        if match.group(0)[:1].isupper():
+            return text[:1].upper() + text[1:]
+        return text
+    return replace
+
+class CompiledRule:
+    __slots__ = ("pattern", "replacement", "regex", "keyword", "hits", "seconds")
+
+    def __init__(self, pattern, replacement, preserve_case=False):
+        self.pattern = pattern
+        self.replacement = case_preserving(replacement) if preserve_case else replacement
+        self.regex = re.compile(pattern, flags=re.IGNORECASE)
+        self.keyword = pick_keyword(pattern)
+        self.hits = 0
+        self.seconds = 0.0
+
+class RegexRuleSet:
+    # loader() returns a list of {"pattern", "replacement"} rules; a rule with a true
+    # "preserve_case" keeps the capital of a match that starts with one. When watch_path (a path
+    # or a list of paths) is given, the rules are reloaded as soon as a file's mtime changes.
+    def __init__(self, loader, watch_path=None, check_interval=RELOAD_CHECK_INTERVAL):
+        self.loader = loader
+        self.watch_path = watch_path
+        self.check_interval = check_interval
+        self.lock = threading.Lock()
+        self.mtime = None
+        self.next_check = 0.0
+        self.reload()
+
+    @classmethod
+    def from_rules(cls, rules):
+        return cls(lambda: rules)
+
+    def reload(self):
+        with self.lock:
+            self.mtime = self._current_mtime()
+            compiled = []
+            for rule in self.loader():
+                try:
+                    compiled.append(CompiledRule(rule["pattern"], rule["replacement"], rule.get("preserve_case", False)))
+                except re.error as e:
+                    print(f"Regex error in rule {rule}: {e}")
+            keywords = sorted({rule.keyword for rule in compiled if rule.keyword}, key=len, reverse=True)
+            # Keywords sharing a start position only report the longest one, so each
+            # keyword also implies every shorter keyword it contains.
+            implied = {keyword: {other for other in keywords if other in keyword} for keyword in keywords}
+            scanner = None
+            if keywords:
+                scanner = re.compile("(?=(" + "|".join(re.escape(keyword) for keyword in keywords) + "))")
+            self.rules, self.implied, self.scanner = compiled, implied, scanner
+
+    def _current_mtime(self):
+        if not self.watch_path:
+            return None
+        paths = [self.watch_path] if isinstance(self.watch_path, str) else self.watch_path
+        mtimes = []
+        for path in paths:
+            try:
+                mtimes.append(os.stat(path).st_mtime_ns)
+            except FileNotFoundError:
+                mtimes.append(None)
+        return tuple(mtimes)
+
+    def maybe_reload(self):
+        if not self.watch_path:
+            return
+        now = time.monotonic()
+        if now < self.next_check:
+            return
+        self.next_check = now + self.check_interval
+        if self._current_mtime() != self.mtime:
+            self.reload()
+
+    def _present_keywords(self, text):
+        if self.scanner is None:
+            return set()
+        present = set()
+        for keyword in self.scanner.findall(text.lower()):
+            present |= self.implied[keyword]
+        return present
+
+    def apply(self, sentence):
+        self.maybe_reload()
+        rules, original = self.rules, sentence
+        present = self._present_keywords(sentence)
+        for rule in rules:
+            if rule.keyword is not None and rule.keyword not in present:
+                continue
+            start = time.perf_counter()
+            try:
+                updated = rule.regex.sub(rule.replacement, sentence)
+            except re.error as e:
+                print(f"Regex error in rule {rule.pattern}: {e}")
+                updated = sentence
+            rule.seconds += time.perf_counter() - start
+            if updated != sentence:
+                rule.hits += 1
+                sentence = updated
+                present = self._present_keywords(sentence)
+        return sentence, original != sentence
+
+    def stats(self):
+        return [
+            {"pattern": rule.pattern, "keyword": rule.keyword, "hits": rule.hits, "seconds": rule.seconds}
+            for rule in self.rules
+        ]
+
+    def __len__(self):
+        return len(self.rules)
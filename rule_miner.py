@@ -0,0 +1,191 @@
+import os
+import re
+import json
+import argparse
+from collections import Counter, defaultdict
+from difflib import SequenceMatcher
+
+from dataset_io import iter_pairs, key_hash
+from regex_engine import pick_keyword
+
+MINED_RULES_FILE = "mined_regex_rules.json"
+TOKEN = re.compile(r"\w+(?:'\w+)*|[^\w\s]")
+MAX_EDIT_TOKENS = 3
+MIN_SUPPORT = 10  # distinct training sentences that must contain the edit
+MIN_FIRED = 5
+MIN_PRECISION = 0.8
+HOLDOUT_PERCENT = 20
+MAX_RULES = 500
+
+def tokenize(text):
+    return TOKEN.findall(text.lower())
+
+def is_word(token):
+    return bool(re.match(r"\w", token))
+
+def extract_edits(original, corrected, max_edit_tokens=MAX_EDIT_TOKENS):
+    # Yields (left, before, after, right) for every small token edit, where left and
+    # right are the neighbouring tokens (or None at the sentence boundaries).
+    source, target = tokenize(original), tokenize(corrected)
+    for tag, i1, i2, j1, j2 in SequenceMatcher(None, source, target, autojunk=False).get_opcodes():
+        if tag == "equal" or i2 - i1 > max_edit_tokens or j2 - j1 > max_edit_tokens:
+            continue
+        left = source[i1 - 1] if i1 > 0 else None
+        right = source[i2] if i2 < len(source) else None
+        yield left, tuple(source[i1:i2]), tuple(target[j1:j2]), right
+
+def generalizations(edit):
+    # The edit with both, one or none of its context tokens. Insertions, deletions and
+    # single-word substitutions keep at least one neighbour, otherwise they would fire
+    # anywhere ("go -> went" regardless of tense).
+    left, before, after, right = edit
+    yield left, before, after, right
+    if right is not None:
+        yield None, before, after, right
+    if left is not None:
+        yield left, before, after, None
+    if before and after and len(before) + len(after) > 2:
+        yield None, before, after, None
+
+def join_items(items, separator):
+    # items are (text, token) pairs; separator(previous token, token) goes between them.
+    text = items[0][0]
+    for (_, previous), (item_text, token) in zip(items, items[1:]):
+        text += separator(previous, token) + item_text
+    return text
+
+def build_rule(left, before, after, right):
+    # The context tokens are captured so their original casing survives the rewrite.
+    pattern_items = [(re.escape(token), token) for token in before]
+    replacement_items = [(token.replace("\\", "\\\\"), token) for token in after]
+    if left is not None:
+        pattern_items.insert(0, (f"({re.escape(left)})", left))
+        replacement_items.insert(0, (r"\g<1>", left))
+    if right is not None:
+        group = 2 if left is not None else 1
+        pattern_items.append((f"({re.escape(right)})", right))
+        replacement_items.append((rf"\g<{group}>", right))
+    if not pattern_items:
+        return None
+    pattern = join_items(pattern_items, lambda previous, token: r"\s+" if is_word(previous) and is_word(token) else r"\s*")
+    replacement = join_items(replacement_items, lambda previous, token: " " if is_word(token) else "") if replacement_items else ""
+    if is_word(pattern_items[0][1]):
+        pattern = r"\b" + pattern
+    if is_word(pattern_items[-1][1]):
+        pattern += r"\b"
+    return {"pattern": pattern, "replacement": replacement}
+
+def split_pairs(pairs):
+    # A stable split: the same pair always lands on the same side between runs. Lang-8
+    # holds many copies of a sentence that differ only in case, spacing or punctuation;
+    # only the first is kept, so copies cannot make up a rule's support on their own.
+    train, holdout = [], []
+    seen = set()
+    for original, corrected in pairs:
+        if original == corrected:
+            continue
+        key = key_hash(" ".join(tokenize(original)))
+        if key in seen:
+            continue
+        seen.add(key)
+        (holdout if key_hash(original) % 100 < HOLDOUT_PERCENT else train).append((original, corrected))
+    return train, holdout
+
+def count_candidates(train, max_edit_tokens=MAX_EDIT_TOKENS):
+    support = Counter()
+    for original, corrected in train:
+        for edit in extract_edits(original, corrected, max_edit_tokens):
+            # A sentence counts once per candidate even if it repeats the edit.
+            support.update(set(generalizations(edit)))
+    return support
+
+class HoldoutScorer:
+    # Applies candidate rules to held-out sentences. A rule is right when it moves an
+    # original closer to its correction; firing on an already corrected sentence, or
+    # making an original worse, counts against it. Only sentences containing all of a
+    # rule's tokens are tried.
+    def __init__(self, holdout):
+        self.sentences = []
+        self.index = defaultdict(set)
+        for original, corrected in holdout:
+            for text in (original, corrected):
+                position = len(self.sentences)
+                self.sentences.append((text, tokenize(corrected)))
+                for token in set(tokenize(text)):
+                    self.index[token].add(position)
+
+    def score(self, candidate, rule):
+        left, before, _, right = candidate
+        tokens = [token for token in (left, *before, right) if token is not None]
+        positions = set.intersection(*(self.index.get(token, set()) for token in tokens))
+        regex = re.compile(rule["pattern"], re.IGNORECASE)
+        fired = correct = 0
+        for position in positions:
+            text, target = self.sentences[position]
+            rewritten = regex.sub(rule["replacement"], text)
+            if rewritten.lower() == text.lower():
+                continue
+            fired += 1
+            before_ratio = SequenceMatcher(None, tokenize(text), target, autojunk=False).ratio()
+            after_ratio = SequenceMatcher(None, tokenize(rewritten), target, autojunk=False).ratio()
+            if after_ratio > before_ratio:
+                correct += 1
+        return fired, correct
+
+def mine_rules(pairs, min_support=MIN_SUPPORT, min_fired=MIN_FIRED, min_precision=MIN_PRECISION,
+               max_rules=MAX_RULES, max_edit_tokens=MAX_EDIT_TOKENS):
+    train, holdout = split_pairs(pairs)
+    support = count_candidates(train, max_edit_tokens)
+    scorer = HoldoutScorer(holdout)
+    best = {}
+    for candidate, count in support.most_common():
+        if count < min_support:
+            break
+        rule = build_rule(*candidate)
+        if rule is None or pick_keyword(rule["pattern"]) is None:
+            continue  # without a keyword the rule would run on every sentence
+        fired, correct = scorer.score(candidate, rule)
+        if fired < min_fired or correct / fired < min_precision:
+            continue
+        rule.update(precision=correct / fired, fired=fired, support=count, preserve_case=True)
+        # One rule per rewrite: the most precise, then the one that fixed the most held-out
+        # sentences, then the one with the most context, then the best supported.
+        _, before, after, _ = candidate
+        context = sum(token is not None for token in (candidate[0], candidate[3]))
+        rank = (rule["precision"], correct, context, count)
+        if (before, after) not in best or rank > best[(before, after)][0]:
+            best[(before, after)] = (rank, rule)
+    ranked = sorted(best.values(), key=lambda entry: entry[0], reverse=True)
+    return [rule for _, rule in ranked[:max_rules]], {"train": len(train), "holdout": len(holdout), "candidates": len(support)}
+
+def load_pairs(paths, builtin=True):
+    pairs = {}
+    for path in paths:
+        try:
+            pairs.update(iter_pairs(path))
+        except FileNotFoundError:
+            print(f"Skipping missing dataset {path}")
+    if builtin:
+        from v5 import INITIAL_DATASET_A, INITIAL_DATASET_B
+        for original, corrected in (*INITIAL_DATASET_A.items(), *INITIAL_DATASET_B.items()):
+            pairs.setdefault(original, corrected)
+    return pairs.items()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Mine regex rules from the dataset correction pairs")
+    parser.add_argument("datasets", nargs="*", default=["lang8_corrected_pairs.json", "text_correction_dataset.json"])
+    parser.add_argument("--output", default=MINED_RULES_FILE)
+    parser.add_argument("--min-support", type=int, default=MIN_SUPPORT, help="distinct training sentences that must contain the edit")
+    parser.add_argument("--min-fired", type=int, default=MIN_FIRED, help="held-out sentences the rule must fire on")
+    parser.add_argument("--min-precision", type=float, default=MIN_PRECISION)
+    parser.add_argument("--max-rules", type=int, default=MAX_RULES)
+    parser.add_argument("--no-builtin", action="store_true", help="leave out the built-in dataset pairs")
+    args = parser.parse_args()
+
+    rules, counts = mine_rules(load_pairs(args.datasets, not args.no_builtin), args.min_support, args.min_fired,
+                               args.min_precision, args.max_rules)
+    with open(args.output + ".tmp", "w", encoding='utf-8') as file:
+        json.dump(rules, file, indent=2, ensure_ascii=False)
+    os.replace(args.output + ".tmp", args.output)
+    print(f"{counts['train']} training and {counts['holdout']} held-out pairs, {counts['candidates']} candidate edits")
+    print(f"Wrote {len(rules)} rules to {args.output}")
@@ -0,0 +1,211 @@
+import json
+import asyncio
+import argparse
+from functools import partial
+from concurrent.futures import ThreadPoolExecutor
+
+import v5
+from stubs import install_stubs
+
+HOST = "127.0.0.1"
+PORT = 8765
+BATCH_WINDOW_MS = 10
+MAX_BATCH_SIZE = 32
+MAX_QUEUE_SIZE = 1024
+MAX_BODY_BYTES = 1024 * 1024
+BATCH_WORKERS = 1
+
+class Overloaded(Exception):
+    pass
+
+class CorrectionService:
+    # Identical texts already queued or being corrected share one future, and queued
+    # texts are drained into micro-batches of up to max_batch_size, waiting at most
+    # batch_window_ms for a batch to fill before it is handed to correct_batch_fn.
+    def __init__(self, correct_batch_fn, batch_window_ms=BATCH_WINDOW_MS, max_batch_size=MAX_BATCH_SIZE,
+                 max_queue_size=MAX_QUEUE_SIZE, workers=BATCH_WORKERS):
+        self.correct_batch_fn = correct_batch_fn
+        self.batch_window = batch_window_ms / 1000
+        self.max_batch_size = max_batch_size
+        self.max_queue_size = max_queue_size
+        self.workers = workers
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="correction-batch")
+        self.queue = None
+        self.inflight = {}
+        self.stats = {"requests": 0, "coalesced": 0, "rejected": 0, "batches": 0, "sentences": 0}
+
+    async def start(self):
+        self.queue = asyncio.Queue(maxsize=self.max_queue_size)
+        self.batchers = [asyncio.create_task(self._batch_loop()) for _ in range(self.workers)]
+
+    async def correct(self, text):
+        self.stats["requests"] += 1
+        future = self.inflight.get(text)
+        if future is not None:
+            self.stats["coalesced"] += 1
+            return await asyncio.shield(future)
+        if self.queue.full():
+            self.stats["rejected"] += 1
+            raise Overloaded()
+        future = asyncio.get_running_loop().create_future()
+        self.inflight[text] = future
+        self.queue.put_nowait((text, future))
+        return await asyncio.shield(future)
+
+    async def _next_batch(self):
+        loop = asyncio.get_running_loop()
+        batch = [await self.queue.get()]
+        deadline = loop.time() + self.batch_window
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _batch_loop(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._next_batch()
+            texts = [text for text, _ in batch]
+            self.stats["batches"] += 1
+            self.stats["sentences"] += len(texts)
+            try:
+                results = await loop.run_in_executor(self.executor, self.correct_batch_fn, texts)
+            except Exception as e:
+                results = [e] * len(texts)
+            for (text, future), result in zip(batch, results):
+                self.inflight.pop(text, None)
+                if future.done():
+                    continue
+                if isinstance(result, Exception):
+                    future.set_exception(result)
+                else:
+                    future.set_result(result)
+
+    async def handle_connection(self, reader, writer):
+        try:
+            while True:
+                request = await read_request(reader)
+                if request is None:
+                    break
+                method, path, headers, body = request
+                status, payload = await self.route(method, path, body)
+                keep_alive = headers.get("connection", "").lower() != "close"
+                await write_response(writer, status, payload, keep_alive)
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        except ValueError as e:
+            await write_response(writer, 400, {"error": str(e)}, False)
+        finally:
+            writer.close()
+
+    async def route(self, method, path, body):
+        if method == "GET" and path == "/health":
+            done, total, current = v5.COMPONENTS.progress()
+            return 200, {"ready": done == total, "loaded": done, "components": total, "loading": current}
+        if method == "GET" and path == "/metrics":
+            return 200, v5.get_metrics_text()
+        if method == "GET" and path == "/stats":
+            return 200, dict(self.stats, queued=self.queue.qsize(), inflight=len(self.inflight))
+        if method != "POST" or path != "/correct":
+            return 404, {"error": f"No route for {method} {path}"}
+        try:
+            request = json.loads(body or b"{}")
+        except ValueError:
+            return 400, {"error": "Body must be JSON"}
+        if not isinstance(request, dict):
+            return 400, {"error": "Body must be a JSON object"}
+        texts = request.get("texts")
+        single = texts is None
+        if single:
+            texts = [request.get("text")]
+        if not isinstance(texts, list) or not texts or not all(isinstance(text, str) and text.strip() for text in texts):
+            return 400, {"error": "Expected a non-empty 'text' string or 'texts' list"}
+        try:
+            results = await asyncio.gather(*(self.correct(text) for text in texts))
+        except Overloaded:
+            return 503, {"error": "Correction queue is full, retry later"}
+        except Exception as e:
+            return 500, {"error": f"{type(e).__name__}: {e}"}
+        return 200, results[0] if single else {"results": results}
+
+async def read_request(reader):
+    request_line = await reader.readline()
+    if not request_line:
+        return None
+    try:
+        method, path, _ = request_line.decode("latin-1").split(" ", 2)
+    except ValueError:
+        raise ValueError("Malformed request line")
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+    length = int(headers.get("content-length", 0))
+    if length > MAX_BODY_BYTES:
+        raise ValueError("Request body too large")
+    body = await reader.readexactly(length) if length else b""
+    return method, path, headers, body
+
+REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 500: "Internal Server Error", 503: "Service Unavailable"}
+
+async def write_response(writer, status, payload, keep_alive=True):
+    if isinstance(payload, str):
+        body, content_type = payload.encode("utf-8"), "text/plain; version=0.0.4; charset=utf-8"
+    else:
+        body, content_type = json.dumps(payload, ensure_ascii=False).encode("utf-8"), "application/json; charset=utf-8"
+    headers = [
+        f"HTTP/1.1 {status} {REASONS.get(status, '')}",
+        f"Content-Type: {content_type}",
+        f"Content-Length: {len(body)}",
+        f"Connection: {'keep-alive' if keep_alive else 'close'}",
+    ]
+    if status == 503:
+        headers.append("Retry-After: 1")
+    writer.write(("\r\n".join(headers) + "\r\n\r\n").encode("latin-1") + body)
+    await writer.drain()
+
+async def serve(service, host=HOST, port=PORT):
+    await service.start()
+    server = await asyncio.start_server(service.handle_connection, host, port)
+    print(f"EGEC correction service listening on http://{host}:{port}")
+    async with server:
+        await server.serve_forever()
+
+def main():
+    parser = argparse.ArgumentParser(description="EGEC correction HTTP service")
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--batch-window-ms", type=float, default=BATCH_WINDOW_MS)
+    parser.add_argument("--max-batch-size", type=int, default=MAX_BATCH_SIZE)
+    parser.add_argument("--max-queue-size", type=int, default=MAX_QUEUE_SIZE)
+    parser.add_argument("--workers", type=int, default=BATCH_WORKERS)
+    parser.add_argument("--stub", action="store_true", help="replace langdetect, LanguageTool and BART with instant stand-ins")
+    args = parser.parse_args()
+
+    correct_batch_fn = v5.correct_batch
+    if args.stub:
+        # The whole pipeline still runs, micro-batching included, but nothing is learned
+        # from the stand-ins' output.
+        install_stubs()
+        correct_batch_fn = partial(v5.correct_batch, persist=False)
+    v5.start_warmup()
+    service = CorrectionService(correct_batch_fn, args.batch_window_ms, args.max_batch_size, args.max_queue_size, args.workers)
+    try:
+        asyncio.run(serve(service, args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        v5.shutdown()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,184 @@
+import os
+import re
+import sys
+import wave
+import queue
+import tempfile
+import threading
+
+CHUNK_CHARS = 400
+PRESYNTHESIS_MIN_CHARS = 200  # shorter texts are spoken directly
+CHUNK_BOUNDARY = re.compile(r"(?<=[.!?])\s+|\n+")
+
+try:
+    import winsound
+except ImportError:
+    winsound = None
+
+def split_chunks(text, max_chars=CHUNK_CHARS):
+    # Packs whole sentences (or lines) into chunks of at most max_chars characters.
+    chunks = []
+    current = ""
+    for piece in CHUNK_BOUNDARY.split(text):
+        piece = piece.strip()
+        if not piece:
+            continue
+        if current and len(current) + 1 + len(piece) > max_chars:
+            chunks.append(current)
+            current = piece
+        else:
+            current = f"{current} {piece}" if current else piece
+    if current:
+        chunks.append(current)
+    return chunks
+
+def wav_seconds(path):
+    with wave.open(path, "rb") as audio:
+        return audio.getnframes() / float(audio.getframerate() or 1)
+
+class SpeechWorker:
+    # Owns the text-to-speech engine on its own thread; say() only queues the text and
+    # returns. Long texts are split into chunks. Where winsound is available they are
+    # synthesized to WAV files ahead of playback, so the next chunk is ready when the
+    # current one ends. Otherwise they are spoken directly. stop() drops everything
+    # queued and cuts off what is playing; the engine itself is only ever touched from
+    # the speech thread, which stops it at the next word once the generation moved on.
+    # on_state(speaking) is called from the worker threads whenever speech starts or the
+    # queue runs dry.
+    def __init__(self, engine_factory, on_state=None):
+        self.engine_factory = engine_factory
+        self.on_state = on_state or (lambda speaking: None)
+        self.queue = queue.Queue()
+        self.playback = queue.Queue()
+        self.condition = threading.Condition()
+        self.generation = 0
+        self.pending = 0
+        self.engine = None
+        self.speaking_generation = None
+        self.thread = threading.Thread(target=self._run, name="speech", daemon=True)
+        self.thread.start()
+        self.player = None
+        if winsound is not None:
+            self.player = threading.Thread(target=self._play, name="speech-playback", daemon=True)
+            self.player.start()
+
+    def say(self, text, interrupt=False):
+        if interrupt:
+            self.stop()
+        presynthesize = self.player is not None and len(text) >= PRESYNTHESIS_MIN_CHARS
+        chunks = split_chunks(text)
+        with self.condition:
+            generation = self.generation
+            self._add_pending(len(chunks))
+        for chunk in chunks:
+            self.queue.put((generation, chunk, presynthesize))
+
+    def stop(self):
+        with self.condition:
+            self.generation += 1
+            self.condition.notify_all()
+        dropped = 0
+        while True:
+            try:
+                item = self.queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is not None:
+                dropped += 1
+        with self.condition:
+            self._add_pending(-dropped)
+
+    def close(self, timeout=1.0):
+        self.stop()
+        self.queue.put(None)
+        self.playback.put(None)
+        self.thread.join(timeout)
+
+    def is_speaking(self):
+        return self.pending > 0
+
+    def _add_pending(self, count):
+        # Called with self.condition held.
+        before = self.pending
+        self.pending = max(0, self.pending + count)
+        if (before == 0) != (self.pending == 0):
+            self.on_state(self.pending > 0)
+
+    def _done(self):
+        with self.condition:
+            self._add_pending(-1)
+
+    def _init_com(self):
+        # SAPI engines must be created on a thread that has initialized COM.
+        if sys.platform != "win32":
+            return
+        try:
+            import comtypes
+        except ImportError:
+            return
+        comtypes.CoInitialize()
+
+    def _run(self):
+        self._init_com()
+        try:
+            self.engine = self.engine_factory()
+            self.engine.connect("started-word", self._on_word)
+        except Exception as e:
+            print(f"Text-to-speech is unavailable: {e}")
+        while True:
+            item = self.queue.get()
+            if item is None:
+                break
+            generation, chunk, presynthesize = item
+            if generation != self.generation or self.engine is None:
+                self._done()
+                continue
+            try:
+                if presynthesize:
+                    self.playback.put((generation, self._synthesize(chunk)))
+                    continue  # the player marks the chunk done
+                self.speaking_generation = generation
+                self.engine.say(chunk)
+                self.engine.runAndWait()
+            except Exception as e:
+                print(f"Text-to-speech failed: {e}")
+            finally:
+                self.speaking_generation = None
+            self._done()
+
+    def _on_word(self, name, location, length):
+        # Runs inside runAndWait on the speech thread, where the engine may be stopped.
+        if self.speaking_generation is not None and self.speaking_generation != self.generation:
+            self.engine.stop()
+
+    def _synthesize(self, chunk):
+        handle, path = tempfile.mkstemp(prefix="egec-speech-", suffix=".wav")
+        os.close(handle)
+        synthesized = False
+        try:
+            self.engine.save_to_file(chunk, path)
+            self.engine.runAndWait()
+            synthesized = True
+        finally:
+            if not synthesized:
+                os.remove(path)
+        return path
+
+    def _play(self):
+        while True:
+            item = self.playback.get()
+            if item is None:
+                break
+            generation, path = item
+            try:
+                if generation == self.generation:
+                    winsound.PlaySound(path, winsound.SND_FILENAME | winsound.SND_ASYNC)
+                    with self.condition:
+                        self.condition.wait_for(lambda: self.generation != generation, timeout=wav_seconds(path))
+                    if generation != self.generation:
+                        winsound.PlaySound(None, winsound.SND_PURGE)
+            except Exception as e:
+                print(f"Audio playback failed: {e}")
+            finally:
+                os.remove(path)
+                self._done()
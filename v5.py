@@ -1,24 +1,86 @@
+import time
+IMPORT_STARTED = time.perf_counter()
 import os
+import sys
+import re
 import json
-import tkinter as tk
-from tkinter import messagebox, font
+import argparse
 import threading
-import re
-from collections import deque
-from functools import lru_cache
-from langdetect import detect, LangDetectException
-import pyttsx4
-import language_tool_python
+from collections import deque, OrderedDict
+from difflib import SequenceMatcher
+from itertools import chain
+from functools import lru_cache, partial
+from warmup import LazyComponents
+from correction_store import CorrectionStore
+from correction_journal import CorrectionJournal, read_journal
+from dataset_io import iter_pairs, write_corpus
+from regex_engine import RegexRuleSet
+from bart_gate import BartGate
+from languagetool_pool import LanguageToolPool
+from inference_pool import InferencePool
+from metrics import Metrics, StageTimer, SlowRequestProfiler
+from model_backend import BACKENDS, load_seq2seq
+from language_gate import LanguageGate, load_langdetect
+from speech import SpeechWorker
 
 # Constants
 REGEX_RULES_FILE = "regex_rules11.json"
+MINED_RULES_FILE = "mined_regex_rules.json"  # written by rule_miner.py
+MINED_RULES_ENABLED = True
 DATASET_A_FILE = "lang8_corrected_pairs.json"
 DATASET_B_FILE = "text_correction_dataset.json"
+DATASET_B_JOURNAL_FILE = "text_correction_dataset.log.jsonl"
 SUPPORTED_LANGUAGE = "en"
 BART_MODEL_NAME = "facebook/bart-large-cnn"
+BART_BACKEND = "eager"  # "int8" or "onnx" export once to MODEL_CACHE_DIR and load from there afterwards
+MODEL_CACHE_DIR = "model_cache"
+LANGUAGETOOL_LANGUAGE = 'en-US'
+LANGUAGETOOL_POOL_SIZE = 2
+LANGUAGETOOL_SERVERS = []  # e.g. ["http://localhost:8081"]; empty starts local servers
+CORRECTION_INDEX_FILE = "correction_index.sqlite3"
+CORRECTION_CACHE_SIZE = 10000
+FUZZY_LOOKUP_ENABLED = True
+FUZZY_SIMILARITY_THRESHOLD = 0.9
+FUZZY_TIME_BUDGET_MS = 20
+BATCH_SIZE = 32
+BART_BATCH_SIZE = 16
+BART_MAX_LENGTH_RATIO = 1.5
+BART_MAX_LENGTH_SLACK = 10
+BART_PRESET = "beam5"
+BART_PRESETS = {
+    "greedy": {"num_beams": 1},
+    "beam2": {"num_beams": 2, "early_stopping": True},
+    "beam5": {"num_beams": 5, "early_stopping": True},
+}
+BART_STATS_HISTORY = 100
+BART_GATE_ENABLED = True
+INFERENCE_WORKERS = 0  # > 0 runs BART and language detection in that many worker processes
+INFERENCE_THREADS_PER_WORKER = None  # None splits the CPU cores evenly between workers
+PROFILE_SLOW_REQUESTS_MS = None  # e.g. 2000 keeps a cProfile trace of every batch slower than 2s
+PROFILE_DIR = "profiles"
+LIVE_DEBOUNCE_MS = 150
+LIVE_CACHE_SIZE = 500
+LIVE_BART_PRESET = "greedy"  # as-you-type favours latency over beam search quality
+
+BART_BATCH_STATS = deque(maxlen=BART_STATS_HISTORY)
+COMPONENTS = LazyComponents()
+LANGUAGE_GATE = LanguageGate(lambda: COMPONENTS.get("langdetect"), SUPPORTED_LANGUAGE)
+METRICS = Metrics()
+METRICS.describe("egec_stage_seconds", "Per-sentence wall time of each pipeline stage (batched stages are shared equally).")
+METRICS.describe("egec_batch_seconds", "Wall time of each correct_batch call.")
+METRICS.describe("egec_dataset_lookups_total", "Dataset lookups by outcome.")
+METRICS.describe("egec_gate_tier_total", "Sentences by the tier that answered them.")
+METRICS.describe("egec_bart_tokens_total", "BART input and output tokens.")
+
+# tkinter, langdetect, pyttsx4, LanguageTool and transformers are imported on first
+# use, so headless callers never pay for the GUI and the GUI can open before the models.
+tk = messagebox = font = None
 
-# Initialize LanguageTool
-GRAMMAR_TOOL = language_tool_python.LanguageTool('en-US')
+def load_tkinter():
+    global tk, messagebox, font
+    import tkinter
+    from tkinter import messagebox as tk_messagebox, font as tk_font
+    tk, messagebox, font = tkinter, tk_messagebox, tk_font
 
 # Pre-populated datasets
 INITIAL_DATASET_A = {
@@ -50,39 +112,76 @@ INITIAL_DATASET_B = {
 
 def load_dataset(file_path, default_data):
     if os.path.exists(file_path):
-        try:
-            with open(file_path, "r", encoding='utf-8') as file:
-                return json.load(file)
-        except UnicodeDecodeError:
-            with open(file_path, "r", encoding='latin-1') as file:
-                return json.load(file)
-    with open(file_path, "w", encoding='utf-8') as file:
-        json.dump(default_data, file, indent=4, ensure_ascii=False)
+        return dict(iter_pairs(file_path))
+    if file_path.endswith(".egec"):
+        write_corpus(default_data.items(), file_path)
+    else:
+        with open(file_path, "w", encoding='utf-8') as file:
+            json.dump(default_data, file, indent=4, ensure_ascii=False)
     return default_data.copy()
 
+def iter_dataset(file_path, default_data):
+    # Streams the pairs without building a dict; creates the file from defaults if missing.
+    if os.path.exists(file_path):
+        return iter_pairs(file_path)
+    return load_dataset(file_path, default_data).items()
+
 def save_dataset(file_path, data):
-    with open(file_path, "w", encoding='utf-8') as file:
-        json.dump(data, file, indent=4, ensure_ascii=False)
+    # data is a dict or an iterable of pairs. Pairs are written one at a time in the
+    # json.dump(indent=4) layout, so a streamed dataset is never collected in memory.
+    pairs = data.items() if isinstance(data, dict) else data
+    temp_path = file_path + ".tmp"
+    with open(temp_path, "w", encoding='utf-8') as file:
+        separator = "\n    "
+        file.write("{")
+        for original, corrected in pairs:
+            file.write(f"{separator}{json.dumps(original, ensure_ascii=False)}: {json.dumps(corrected, ensure_ascii=False)}")
+            separator = ",\n    "
+        file.write("}" if separator == "\n    " else "\n}")
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(temp_path, file_path)
+
+def iter_dataset_b():
+    # Dataset B is the compacted JSON file plus any corrections still in the journal.
+    return chain(iter_dataset(DATASET_B_FILE, INITIAL_DATASET_B), read_journal(DATASET_B_JOURNAL_FILE))
+
+@lru_cache(maxsize=1)
+def get_correction_journal():
+    return CorrectionJournal(
+        DATASET_B_JOURNAL_FILE,
+        load_fn=lambda: iter_dataset(DATASET_B_FILE, INITIAL_DATASET_B),
+        save_fn=lambda data: save_dataset(DATASET_B_FILE, data),
+        on_batch=lambda pairs: get_correction_store().put_many("dataset_b", pairs),
+    )
+
+def get_correction_store():
+    return COMPONENTS.get("correction_store")
+
+def load_correction_store():
+    return CorrectionStore(
+        [
+            ("dataset_a", (DATASET_A_FILE,), lambda: iter_dataset(DATASET_A_FILE, INITIAL_DATASET_A)),
+            ("dataset_b", (DATASET_B_FILE, DATASET_B_JOURNAL_FILE), iter_dataset_b),
+        ],
+        index_path=CORRECTION_INDEX_FILE,
+        cache_size=CORRECTION_CACHE_SIZE,
+        fuzzy_threshold=FUZZY_SIMILARITY_THRESHOLD,
+        fuzzy_time_budget_ms=FUZZY_TIME_BUDGET_MS,
+    )
+
+def load_fuzzy_index():
+    # Until this has run, lookups are exact-only rather than waiting for the index.
+    if not FUZZY_LOOKUP_ENABLED:
+        return None
+    return get_correction_store().build_fuzzy_index()
 
 def add_to_dataset_b(input_text, corrected_text):
-    dataset_b = load_dataset(DATASET_B_FILE, INITIAL_DATASET_B)
-    dataset_b[input_text] = corrected_text
-    save_dataset(DATASET_B_FILE, dataset_b)
+    # Only queued here; the journal writer thread updates the log and the lookup store.
+    get_correction_journal().append(input_text, corrected_text)
 
 def get_corrected_text_from_datasets(input_text):
-    dataset_a = load_dataset(DATASET_A_FILE, INITIAL_DATASET_A)
-    dataset_b = load_dataset(DATASET_B_FILE, INITIAL_DATASET_B)
-    
-    if input_text in dataset_a:
-        return dataset_a[input_text], "dataset_a"
-    if input_text in dataset_b:
-        return dataset_b[input_text], "dataset_b"
-    return None, None
-
-def is_probably_english(sentence):
-    common_words = {"the", "and", "to", "of", "in", "a", "i", "is", "it", "that"}
-    words = set(sentence.lower().split())
-    return len(words.intersection(common_words)) >= 2
+    return get_correction_store().get(input_text)
 
 def load_regex_rules():
     try:
@@ -120,24 +219,54 @@ def load_regex_rules():
         ]
         return rules
 
-@lru_cache(maxsize=1)
+def load_mined_rules():
+    # Mined rules run after the handwritten ones, in the miner's precision order.
+    if not MINED_RULES_ENABLED:
+        return []
+    try:
+        with open(MINED_RULES_FILE, "r", encoding='utf-8') as file:
+            return json.load(file)
+    except FileNotFoundError:
+        return []
+    except ValueError as e:
+        print(f"Ignoring {MINED_RULES_FILE}: {e}")
+        return []
+
+def load_all_regex_rules():
+    return list(load_regex_rules()) + load_mined_rules()
+
+def get_regex_rule_set():
+    return COMPONENTS.get("regex_rules")
+
+def get_bart_gate():
+    return COMPONENTS.get("bart_gate")
+
+def get_gate_stats():
+    return get_bart_gate().stats()
+
 def get_bart_model():
-    from transformers import AutoModelForSeq2SeqLM, AutoTokenizer
-    tokenizer = AutoTokenizer.from_pretrained(BART_MODEL_NAME)
-    model = AutoModelForSeq2SeqLM.from_pretrained(BART_MODEL_NAME)
-    return tokenizer, model
+    return COMPONENTS.get("bart")
+
+def load_bart_model():
+    return load_seq2seq(BART_MODEL_NAME, BART_BACKEND, MODEL_CACHE_DIR)
 
 def apply_regex_rules(sentence, regex_rules):
-    original = sentence
-    for rule in regex_rules:
-        try:
-            sentence = re.sub(rule["pattern"], rule["replacement"], sentence, flags=re.IGNORECASE)
-        except re.error as e:
-            print(f"Regex error in rule {rule}: {e}")
-    return sentence, original != sentence
+    if not isinstance(regex_rules, RegexRuleSet):
+        regex_rules = RegexRuleSet.from_rules(regex_rules)
+    return regex_rules.apply(sentence)
 
-def grammar_check_with_languagetool(sentence):
-    matches = GRAMMAR_TOOL.check(sentence)
+def get_languagetool_pool():
+    return COMPONENTS.get("languagetool")
+
+def load_languagetool_pool():
+    pool = LanguageToolPool(LANGUAGETOOL_LANGUAGE, size=LANGUAGETOOL_POOL_SIZE, servers=LANGUAGETOOL_SERVERS)
+    pool.warm_up()
+    return pool
+
+def grammar_result(sentence, matches):
+    if not matches:
+        return sentence, [], False
+    import language_tool_python
     suggestions = []
     corrected = language_tool_python.utils.correct(sentence, matches)
     
@@ -151,78 +280,455 @@ def grammar_check_with_languagetool(sentence):
     
     return corrected, suggestions, len(matches) > 0
 
-def refine_with_bart(tokenizer, model, sentence):
-    inputs = tokenizer(sentence, return_tensors="pt", max_length=512, truncation=True)
-    summary_ids = model.generate(inputs.input_ids, max_length=512, num_beams=5, early_stopping=True)
-    refined = tokenizer.decode(summary_ids[0], skip_special_tokens=True)
-    if len(refined.split()) > len(sentence.split()) * 1.2:
-        return sentence, False
-    return refined, refined != sentence
+def grammar_check_with_languagetool(sentence):
+    return grammar_check_batch([sentence])[0]
 
-def correct_sentence_structure(sentence):
-    corrected_text, source = get_corrected_text_from_datasets(sentence)
-    if corrected_text:
-        return {
-            "original": sentence,
-            "corrected": corrected_text,
-            "errors": [],
-            "source": source,
-            "changes_made": sentence != corrected_text,
-            "stages": [("Dataset", corrected_text)] if sentence != corrected_text else []
-        }
-    
-    warning = None
-    try:
-        detected_lang = detect(sentence)
-        if detected_lang != SUPPORTED_LANGUAGE and not is_probably_english(sentence):
-            warning = f"Detected language is not English ({detected_lang}). Results may be inaccurate."
-    except LangDetectException:
-        warning = "Could not detect language. Results may be inaccurate."
-    
-    stages = []
-    suggestions = []
-    changes_made = False
-    current_text = sentence
+def grammar_check_batch(sentences):
+    all_matches = get_languagetool_pool().check_batch(sentences)
+    return [grammar_result(sentence, matches) for sentence, matches in zip(sentences, all_matches)]
 
-    # Step 1: Apply regex rules
-    regex_rules = load_regex_rules()
-    regex_corrected, regex_changed = apply_regex_rules(current_text, regex_rules)
-    if regex_changed:
-        stages.append(("Regex", regex_corrected))
-        changes_made = True
-        current_text = regex_corrected
+def refine_with_bart_batch(tokenizer, model, sentences, preset=None, token_counts=None):
+    # token_counts, when given, receives (input tokens, output tokens) per sentence.
+    if not sentences:
+        return []
+    generation_options = BART_PRESETS[preset or BART_PRESET]
+    encoded = tokenizer(sentences, max_length=512, truncation=True)["input_ids"]
+    # Bucket by token length so each generate call pads as little as possible.
+    order = sorted(range(len(sentences)), key=lambda index: len(encoded[index]))
+    refined_texts = [None] * len(sentences)
+    output_lengths = [0] * len(sentences)
+    for start in range(0, len(order), BART_BATCH_SIZE):
+        bucket = order[start:start + BART_BATCH_SIZE]
+        inputs = tokenizer.pad({"input_ids": [encoded[index] for index in bucket]}, return_tensors="pt")
+        input_length = max(len(encoded[index]) for index in bucket)
+        max_length = min(512, int(input_length * BART_MAX_LENGTH_RATIO) + BART_MAX_LENGTH_SLACK)
+        batch_start = time.perf_counter()
+        summary_ids = model.generate(inputs.input_ids, attention_mask=inputs.attention_mask, max_length=max_length, **generation_options)
+        elapsed = time.perf_counter() - batch_start
+        output_tokens = int((summary_ids != tokenizer.pad_token_id).sum())
+        BART_BATCH_STATS.append({
+            "batch_size": len(bucket),
+            "input_tokens": sum(len(encoded[index]) for index in bucket),
+            "output_tokens": output_tokens,
+            "max_length": max_length,
+            "preset": preset or BART_PRESET,
+            "seconds": elapsed,
+            "tokens_per_sec": output_tokens / elapsed if elapsed else 0.0,
+        })
+        for index, ids in zip(bucket, summary_ids):
+            refined_texts[index] = tokenizer.decode(ids, skip_special_tokens=True)
+            output_lengths[index] = int((ids != tokenizer.pad_token_id).sum())
+    if token_counts is not None:
+        token_counts.extend(zip(map(len, encoded), output_lengths))
 
-    # Step 2: Grammar Check with LanguageTool
-    grammar_corrected, grammar_suggestions, grammar_changed = grammar_check_with_languagetool(current_text)
-    if grammar_changed:
-        stages.append(("Grammar Tool", grammar_corrected))
-        suggestions.extend(grammar_suggestions)
-        changes_made = True
-        current_text = grammar_corrected
-
-    # Step 3: Refine with BART (always applied)
-    tokenizer, model = get_bart_model()
-    bart_corrected, bart_changed = refine_with_bart(tokenizer, model, current_text)
-    if bart_changed:
-        stages.append(("BART Refinement", bart_corrected))
-        changes_made = True
-        current_text = bart_corrected
-    else:
-        stages.append(("BART Refinement", bart_corrected))  # Log even if no change
+    results = []
+    for sentence, refined in zip(sentences, refined_texts):
+        if len(refined.split()) > len(sentence.split()) * 1.2:
+            results.append((sentence, False))
+        else:
+            results.append((refined, refined != sentence))
+    return results
+
+def get_bart_stats():
+    return list(BART_BATCH_STATS)
+
+def refine_in_worker(tokenizer, model, sentences, preset=None):
+    # Worker processes run one task at a time, so their stats deque only holds this call.
+    BART_BATCH_STATS.clear()
+    token_counts = []
+    results = refine_with_bart_batch(tokenizer, model, sentences, preset, token_counts)
+    return list(zip(results, token_counts)), list(BART_BATCH_STATS)
+
+def get_inference_pool():
+    return COMPONENTS.get("inference_pool")
+
+def load_inference_pool():
+    if not INFERENCE_WORKERS:
+        return None
+    # Workers re-import this module with its defaults, so the backend travels with the loader.
+    load_model = partial(load_seq2seq, BART_MODEL_NAME, BART_BACKEND, MODEL_CACHE_DIR)
+    pool = InferencePool(INFERENCE_WORKERS, load_model, refine_in_worker, detect_language,
+                         chunk_size=BART_BATCH_SIZE, threads_per_worker=INFERENCE_THREADS_PER_WORKER)
+    pool.warm_up()
+    return pool
+
+def refine_texts(texts, bart_preset=None):
+    # Returns the refinement results and the (input, output) token counts per text.
+    pool = get_inference_pool()
+    if pool is None:
+        tokenizer, model = get_bart_model()
+        token_counts = []
+        results = refine_with_bart_batch(tokenizer, model, texts, bart_preset, token_counts)
+        return results, token_counts
+    results, batch_stats = pool.refine(texts, bart_preset)
+    BART_BATCH_STATS.extend(batch_stats)
+    return [result for result, _ in results], [counts for _, counts in results]
+
+def refine_with_bart(tokenizer, model, sentence, preset=None):
+    return refine_with_bart_batch(tokenizer, model, [sentence], preset)[0]
+
+def detect_language(text):
+    return COMPONENTS.get("langdetect")(text)
+
+def detect_language_warning(sentence):
+    return LANGUAGE_GATE.warning(sentence)
 
-    if changes_made:
-        add_to_dataset_b(sentence, current_text)
+def get_language_gate_stats():
+    return LANGUAGE_GATE.stats()
 
+def detect_language_warnings(sentences):
+    # The gate's fast path and memo run here; only texts that need langdetect go to the pool.
+    pool = get_inference_pool()
+    return LANGUAGE_GATE.warnings(sentences, pool.detect if pool is not None else None)
+
+def create_speech_engine():
+    import pyttsx4
+    engine = pyttsx4.init()
+    engine.setProperty('rate', engine.getProperty('rate') - 50)
+    engine.setProperty('voice', engine.getProperty('voices')[0].id)
+    return engine
+
+def dataset_result(sentence, corrected_text, source):
     return {
+        "original": sentence,
+        "corrected": corrected_text,
+        "errors": [],
+        "source": source,
+        "changes_made": sentence != corrected_text,
+        "stages": [("Dataset", corrected_text)] if sentence != corrected_text else []
+    }
+
+def record_timing(result, stage, timer, batch_size=1):
+    # Batched stages are charged to each sentence as an equal share of the batch time.
+    wall, cpu = timer.wall / batch_size, timer.cpu / batch_size
+    result.setdefault("timings", {})[stage] = {"wall_ms": wall * 1000, "cpu_ms": cpu * 1000, "batch_size": batch_size}
+    METRICS.observe("egec_stage_seconds", wall, stage=stage)
+
+def get_slow_request_profiler():
+    return COMPONENTS.get("profiler")
+
+def correct_batch(sentences, bart_preset=None, persist=True):
+    # persist=False leaves new corrections out of dataset B, e.g. for half-typed live input.
+    profiler = get_slow_request_profiler()
+    with StageTimer() as timer:
+        if profiler is None:
+            results = run_pipeline(sentences, bart_preset, persist)
+        else:
+            with profiler.profile(f"batch-{len(sentences)}"):
+                results = run_pipeline(sentences, bart_preset, persist)
+    METRICS.observe("egec_batch_seconds", timer.wall)
+    METRICS.inc("egec_sentences_total", len(sentences))
+    return results
+
+def run_pipeline(sentences, bart_preset=None, persist=True):
+    results = [None] * len(sentences)
+    pending = {}
+    lookup_timers = {}
+    for index, sentence in enumerate(sentences):
+        if sentence in pending:
+            pending[sentence].append(index)
+            continue
+        with StageTimer() as timer:
+            corrected_text, source = get_corrected_text_from_datasets(sentence)
+        if corrected_text:
+            results[index] = dataset_result(sentence, corrected_text, source)
+            record_timing(results[index], "dataset", timer)
+            METRICS.inc("egec_dataset_lookups_total", result="fuzzy_hit" if source.endswith("_fuzzy") else "hit")
+            METRICS.inc("egec_gate_tier_total", tier="dataset")
+            get_bart_gate().record("dataset")
+        else:
+            pending[sentence] = [index]
+            lookup_timers[sentence] = timer
+            METRICS.inc("egec_dataset_lookups_total", result="miss")
+
+    unique = list(pending)
+    with StageTimer() as detect_timer:
+        warnings = detect_language_warnings(unique)
+    states = [{
         "warning": warning,
         "original": sentence,
-        "corrected": current_text,
-        "errors": suggestions,
+        "corrected": sentence,
+        "errors": [],
         "source": "new_correction",
-        "changes_made": changes_made,
-        "stages": stages
+        "changes_made": False,
+        "stages": [],
+        "timings": {},
+        "tokens": {"input": 0, "output": 0}
+    } for sentence, warning in zip(unique, warnings)]
+    for state in states:
+        record_timing(state, "dataset", lookup_timers[state["original"]])
+        record_timing(state, "langdetect", detect_timer, len(states))
+
+    # Step 1: Apply regex rules
+    regex_rules = get_regex_rule_set()
+    regex_hits = []
+    for state in states:
+        with StageTimer() as timer:
+            regex_corrected, regex_changed = apply_regex_rules(state["corrected"], regex_rules)
+        record_timing(state, "regex", timer)
+        regex_hits.append(regex_changed)
+        if regex_changed:
+            state["stages"].append(("Regex", regex_corrected))
+            state["changes_made"] = True
+            state["corrected"] = regex_corrected
+
+    # Step 2: Grammar Check with LanguageTool
+    with StageTimer() as timer:
+        grammar_results = grammar_check_batch([state["corrected"] for state in states])
+    for state, (grammar_corrected, grammar_suggestions, grammar_changed) in zip(states, grammar_results):
+        record_timing(state, "languagetool", timer, len(states))
+        if grammar_changed:
+            state["stages"].append(("Grammar Tool", grammar_corrected))
+            state["errors"].extend(grammar_suggestions)
+            state["changes_made"] = True
+            state["corrected"] = grammar_corrected
+
+    # Step 3: Refine with BART, unless the gate decides the cheaper stages were enough
+    gate = get_bart_gate()
+    to_refine = []
+    for state, regex_changed, (_, grammar_suggestions, _) in zip(states, regex_hits, grammar_results):
+        run_bart, tier = gate.should_refine(state["corrected"], len(grammar_suggestions), regex_changed)
+        if run_bart or not BART_GATE_ENABLED:
+            to_refine.append(state)
+        tier = tier if BART_GATE_ENABLED else "model_forced"
+        gate.record(tier)
+        METRICS.inc("egec_gate_tier_total", tier=tier)
+    if to_refine:
+        with StageTimer() as timer:
+            bart_results, token_counts = refine_texts([state["corrected"] for state in to_refine], bart_preset)
+        for state, (bart_corrected, bart_changed), (input_tokens, output_tokens) in zip(to_refine, bart_results, token_counts):
+            record_timing(state, "bart", timer, len(to_refine))
+            state["tokens"] = {"input": input_tokens, "output": output_tokens}
+            METRICS.inc("egec_bart_tokens_total", input_tokens, direction="input")
+            METRICS.inc("egec_bart_tokens_total", output_tokens, direction="output")
+            state["stages"].append(("BART Refinement", bart_corrected))  # Log even if no change
+            if bart_changed:
+                state["changes_made"] = True
+                state["corrected"] = bart_corrected
+
+    for sentence, state in zip(unique, states):
+        if state["changes_made"] and persist:
+            add_to_dataset_b(sentence, state["corrected"])
+        for position, index in enumerate(pending[sentence]):
+            results[index] = state if position == 0 else dict(state)
+    return results
+
+def get_metrics_text():
+    return METRICS.render_prometheus()
+
+def correct_sentence_structure(sentence):
+    return correct_batch([sentence])[0]
+
+STAGE_ORDER = ["Dataset", "Regex", "Grammar Tool", "BART Refinement"]
+SENTENCE_PATTERN = re.compile(r"\S.*?(?:[.!?]+[\"')\]]*(?=\s)|$)", re.S)
+ABBREVIATIONS = {"mr.", "mrs.", "ms.", "dr.", "prof.", "st.", "vs.", "etc.", "e.g.", "i.e.", "a.m.", "p.m."}
+
+def split_sentences(text):
+    spans = []
+    for match in SENTENCE_PATTERN.finditer(text):
+        start, end = match.start(), match.start() + len(match.group().rstrip())
+        if spans and text[spans[-1][0]:spans[-1][1]].split()[-1].lower() in ABBREVIATIONS:
+            spans[-1] = (spans[-1][0], end)
+        else:
+            spans.append((start, end))
+    return spans
+
+def map_offset(source, target, offset):
+    # Maps a character offset in `source` onto the corresponding position in `target`.
+    for tag, i1, i2, j1, j2 in SequenceMatcher(None, source, target, autojunk=False).get_opcodes():
+        if i1 <= offset < i2 or (offset == i2 == len(source)):
+            return j1 + (offset - i1 if tag == "equal" else 0)
+    return min(offset, len(target))
+
+def assemble(text, spans, pieces):
+    parts = []
+    previous_end = 0
+    for (start, end), piece in zip(spans, pieces):
+        parts.append(text[previous_end:start])
+        parts.append(piece)
+        previous_end = end
+    parts.append(text[previous_end:])
+    return "".join(parts)
+
+def original_errors(result, start=0):
+    # LanguageTool offsets refer to the text it checked, i.e. after the regex stage; this
+    # maps them onto the original sentence, placed at `start` in its paragraph.
+    checked_text = dict(result["stages"]).get("Regex", result["original"])
+    return [dict(error, offset=start + map_offset(checked_text, result["original"], error["offset"]))
+            for error in result["errors"]]
+
+def merge_paragraph(text, spans, results):
+    current = [result["original"] for result in results]
+    stages = []
+    for stage in STAGE_ORDER:
+        stage_texts = [dict(result["stages"]).get(stage) for result in results]
+        if any(stage_text is not None for stage_text in stage_texts):
+            current = [stage_text if stage_text is not None else previous for stage_text, previous in zip(stage_texts, current)]
+            stages.append((stage, assemble(text, spans, current)))
+
+    errors = []
+    for (start, _), result in zip(spans, results):
+        errors.extend(original_errors(result, start))
+
+    sources = {result["source"] for result in results}
+    if len(sources) == 1:
+        source = sources.pop()
+    elif all(source.startswith("dataset_") for source in sources):
+        source = "dataset_mixed"
+    else:
+        source = "new_correction"
+    warnings = list(dict.fromkeys(result["warning"] for result in results if result.get("warning")))
+    timings = {}
+    for result in results:
+        for stage, timing in result.get("timings", {}).items():
+            total = timings.setdefault(stage, {"wall_ms": 0.0, "cpu_ms": 0.0})
+            total["wall_ms"] += timing["wall_ms"]
+            total["cpu_ms"] += timing["cpu_ms"]
+    return {
+        "warning": " ".join(warnings) or None,
+        "original": text,
+        "corrected": assemble(text, spans, [result["corrected"] for result in results]),
+        "errors": errors,
+        "source": source,
+        "changes_made": any(result["changes_made"] for result in results),
+        "stages": stages,
+        "timings": timings,
+        "tokens": {
+            "input": sum(result.get("tokens", {}).get("input", 0) for result in results),
+            "output": sum(result.get("tokens", {}).get("output", 0) for result in results)
+        },
+        "sentences": [dict(result, offset=start) for (start, _), result in zip(spans, results)]
     }
 
+def correct_paragraphs(texts, bart_preset=None):
+    # Every sentence of every text goes through one correct_batch call, so dataset hits
+    # are answered per sentence and the rest share the LanguageTool and BART batches.
+    all_spans = [split_sentences(text) for text in texts]
+    sentences = [text[start:end] for text, spans in zip(texts, all_spans) for start, end in spans]
+    sentence_results = iter(correct_batch(sentences, bart_preset))
+    return [paragraph_result(text, spans, [next(sentence_results) for _ in spans]) for text, spans in zip(texts, all_spans)]
+
+def paragraph_result(text, spans, results):
+    if not spans:
+        return dataset_result(text, text, "empty")
+    if len(spans) == 1 and spans[0] == (0, len(text)):
+        return dict(results[0], errors=original_errors(results[0]))
+    return merge_paragraph(text, spans, results)
+
+def correct_paragraph(text, bart_preset=None):
+    return correct_paragraphs([text], bart_preset)[0]
+
+def correct_paragraph_incremental(text, cache, bart_preset=None, cache_size=LIVE_CACHE_SIZE):
+    # Like correct_paragraph, but sentences already in `cache` (an OrderedDict of
+    # sentence -> result) are reused, so an edit only re-corrects the sentences it touched.
+    # Returns the result and the number of sentences that had to be corrected. Nothing is
+    # added to dataset B; only an explicit correct_paragraph call does that.
+    spans = split_sentences(text)
+    sentences = [text[start:end] for start, end in spans]
+    missing = [sentence for sentence in dict.fromkeys(sentences) if sentence not in cache]
+    if missing:
+        for sentence, result in zip(missing, correct_batch(missing, bart_preset, persist=False)):
+            cache[sentence] = result
+    for sentence in sentences:
+        cache.move_to_end(sentence)
+    results = [dict(cache[sentence]) for sentence in sentences]
+    while len(cache) > cache_size:
+        cache.popitem(last=False)
+    return paragraph_result(text, spans, results), len(missing)
+
+def tk_offsets(text, astral_width):
+    # Tk index of every character position in text. Tk 8.6 counts a character outside
+    # the BMP (the emoji in the suggestions) as two units, a UTF-16 surrogate pair.
+    offsets = [0]
+    for char in text:
+        offsets.append(offsets[-1] + (astral_width if ord(char) > 0xFFFF else 1))
+    return offsets
+
+def update_text_widget(widget, text):
+    # Rewrites only the characters that differ, so the view does not flicker or jump.
+    current = widget.get("1.0", "end-1c")
+    if current == text:
+        return
+    astral_width = 1
+    if any(ord(char) > 0xFFFF for char in current):
+        astral_width = int(widget.tk.call("string", "length", "\U0001F50D"))
+    offsets = tk_offsets(current, astral_width)
+    opcodes = SequenceMatcher(None, current, text, autojunk=False).get_opcodes()
+    for tag, i1, i2, j1, j2 in reversed(opcodes):
+        if tag == "equal":
+            continue
+        if i2 > i1:
+            widget.delete(f"1.0+{offsets[i1]}c", f"1.0+{offsets[i2]}c")
+        if j2 > j1:
+            widget.insert(f"1.0+{offsets[i1]}c", text[j1:j2])
+
+COMPONENTS.register("correction_store", load_correction_store)
+COMPONENTS.register("fuzzy_index", load_fuzzy_index)
+COMPONENTS.register("regex_rules", lambda: RegexRuleSet(load_all_regex_rules, watch_path=[REGEX_RULES_FILE, MINED_RULES_FILE]))
+COMPONENTS.register("bart_gate", lambda: BartGate(get_correction_store().iter_pairs))
+COMPONENTS.register("langdetect", load_langdetect)
+COMPONENTS.register("languagetool", load_languagetool_pool)
+COMPONENTS.register("bart", load_bart_model)
+COMPONENTS.register("inference_pool", load_inference_pool)
+COMPONENTS.register("profiler", lambda: SlowRequestProfiler(PROFILE_SLOW_REQUESTS_MS, PROFILE_DIR) if PROFILE_SLOW_REQUESTS_MS else None)
+
+def start_warmup():
+    return COMPONENTS.start()
+
+def get_startup_report():
+    report = {"import": {"status": "ready", "seconds": IMPORT_SECONDS, "error": None}}
+    report.update(COMPONENTS.report())
+    return report
+
+def shutdown():
+    get_correction_journal().close()
+    if COMPONENTS.is_ready("languagetool"):
+        get_languagetool_pool().close()
+    if COMPONENTS.is_ready("inference_pool") and get_inference_pool() is not None:
+        get_inference_pool().close()
+
+def read_batch_input(file_path):
+    with open(file_path, "r", encoding='utf-8') as file:
+        for line in file:
+            line = line.rstrip("\n")
+            if not line.strip():
+                continue
+            if file_path.endswith(".jsonl"):
+                entry = json.loads(line)
+                if isinstance(entry, dict):
+                    entry = entry.get("text", entry.get("sentence", ""))
+                line = entry
+            yield line
+
+def run_batch(input_path, output_path=None, batch_size=BATCH_SIZE, bart_preset=None, paragraphs=False):
+    output = open(output_path, "w", encoding='utf-8') if output_path else sys.stdout
+    start = time.perf_counter()
+    processed = 0
+    try:
+        batch = []
+        for sentence in read_batch_input(input_path):
+            batch.append(sentence)
+            if len(batch) >= batch_size:
+                processed += write_batch_results(output, batch, bart_preset, paragraphs)
+                batch = []
+                elapsed = time.perf_counter() - start
+                print(f"{processed} sentences, {processed / elapsed:.1f} sentences/sec", file=sys.stderr)
+        if batch:
+            processed += write_batch_results(output, batch, bart_preset, paragraphs)
+    finally:
+        if output_path:
+            output.close()
+    elapsed = time.perf_counter() - start
+    print(f"Corrected {processed} sentences in {elapsed:.2f}s ({processed / elapsed if elapsed else 0:.1f} sentences/sec)", file=sys.stderr)
+    return processed
+
+def write_batch_results(output, batch, bart_preset=None, paragraphs=False):
+    correct = correct_paragraphs if paragraphs else correct_batch
+    for result in correct(batch, bart_preset):
+        output.write(json.dumps(result, ensure_ascii=False) + "\n")
+    output.flush()
+    return len(batch)
+
 class EGECGrammarCorrectionBot:
     def __init__(self, root):
         self.root = root
@@ -249,13 +755,13 @@ class EGECGrammarCorrectionBot:
         self.processing_button = None
         self.blink_state = False
 
-        self.speech_queue = deque()
-        self.is_speaking = False
-        self.engine = pyttsx4.init()
-        self.engine.setProperty('rate', self.engine.getProperty('rate') - 50)
-        self.engine.setProperty('voice', self.engine.getProperty('voices')[0].id)
-        self.engine.connect('started-utterance', self.on_speech_start)
-        self.engine.connect('finished-utterance', self.on_speech_end)
+        self.live_cache = OrderedDict()
+        self.live_after = None
+        self.live_generation = 0
+        self.live_busy = False
+        self.live_rerun = False
+
+        self.speech = SpeechWorker(create_speech_engine, on_state=lambda speaking: self.root.after(0, self.on_speech_state, speaking))
 
         self.create_widgets()
 
@@ -276,6 +782,10 @@ class EGECGrammarCorrectionBot:
         
         self.text_input = tk.Entry(input_frame, width=50, bg=self.BUTTON_COLOR, fg=self.TEXT_COLOR, insertbackground=self.TEXT_COLOR, font=self.TEXT_FONT, relief=tk.FLAT, borderwidth=2)
         self.text_input.pack(fill="x", pady=5)
+        self.text_input.bind("<KeyRelease>", self.on_input_changed)
+
+        self.live_var = tk.BooleanVar(value=False)
+        tk.Checkbutton(input_frame, text="⚡ Correct as I type", variable=self.live_var, command=self.on_input_changed, bg=self.BACKGROUND_COLOR, fg=self.FOREGROUND_COLOR, selectcolor=self.BUTTON_COLOR, activebackground=self.BACKGROUND_COLOR, activeforeground=self.TEXT_COLOR, font=self.DEFAULT_FONT).pack(anchor="w")
 
         button_frame = tk.Frame(main_frame, bg=self.BACKGROUND_COLOR)
         button_frame.pack(fill="x", pady=5)
@@ -308,6 +818,23 @@ class EGECGrammarCorrectionBot:
         scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
         self.suggestions_text.config(yscrollcommand=scrollbar.set)
 
+        self.status_label = tk.Label(main_frame, text="", bg=self.BACKGROUND_COLOR, fg=self.FOREGROUND_COLOR, font=self.DEFAULT_FONT, anchor="w")
+        self.status_label.pack(fill="x", pady=(5,0))
+        self.update_warmup_status()
+
+    def update_warmup_status(self):
+        done, total, current = COMPONENTS.progress()
+        if done < total:
+            self.status_label.config(text=f"⏳ Loading components ({done}/{total}): {current or '...'}")
+            self.root.after(500, self.update_warmup_status)
+            return
+        seconds = sum(entry["seconds"] or 0 for entry in get_startup_report().values())
+        failed = [name for name, entry in COMPONENTS.report().items() if entry["status"] == "failed"]
+        if failed:
+            self.status_label.config(text=f"⚠️ Ready in {seconds:.1f}s, failed to load: {', '.join(failed)}")
+        else:
+            self.status_label.config(text=f"✅ Ready (startup {seconds:.1f}s)")
+
     def start_processing(self, button):
         self.processing_button = button
         self.disable_buttons()
@@ -355,12 +882,7 @@ class EGECGrammarCorrectionBot:
             messagebox.showerror("Error", "Please enter some text!")
             return
         
-        self.start_processing(self.speak_button)
-        threading.Thread(target=self._speak_text_thread, args=(text,), daemon=True).start()
-
-    def _speak_text_thread(self, text):
         self.speak_text(text, interrupt=True)
-        self.root.after(0, self.stop_processing)
 
     def correct_text(self):
         text = self.text_input.get()
@@ -372,22 +894,26 @@ class EGECGrammarCorrectionBot:
         threading.Thread(target=self._correct_text_thread, args=(text,), daemon=True).start()
 
     def _correct_text_thread(self, text):
-        result = correct_sentence_structure(text)
-        
-        self.root.after(0, lambda: self.original_text.delete(1.0, tk.END))
-        self.root.after(0, lambda: self.original_text.insert(tk.END, f"{result['original']}\n"))
-        
-        self.root.after(0, lambda: self.corrected_text.delete(1.0, tk.END))
-        self.root.after(0, lambda: self.corrected_text.insert(tk.END, f"{result['corrected']}\n"))
-        
-        self.root.after(0, lambda: self.suggestions_text.delete(1.0, tk.END))
-        if result.get("warning"):
-            self.root.after(0, lambda: messagebox.showwarning("Warning", result["warning"]))
-        
+        result = correct_paragraph(text)
+        suggestions_text, speech_output = self.describe_result(result)
+        self.root.after(0, self.show_result, result, suggestions_text, True)
+        # Queued on the speech worker, so the next correction can start while this is spoken.
+        self.speak_text(speech_output, interrupt=True, display=False)
+        self.root.after(0, self.stop_processing)
+
+    def show_result(self, result, suggestions_text, show_warning=False):
+        update_text_widget(self.original_text, f"{result['original']}\n")
+        update_text_widget(self.corrected_text, f"{result['corrected']}\n")
+        update_text_widget(self.suggestions_text, suggestions_text)
+        self.suggestions_text.see(tk.END)
+        if show_warning and result.get("warning"):
+            messagebox.showwarning("Warning", result["warning"])
+
+    def describe_result(self, result):
         speech_output = f"Original text: {result['original']}\nCorrected text: {result['corrected']}"
         suggestions_text = ""
         
-        if result["source"] in ["dataset_a", "dataset_b"]:
+        if result["source"].startswith("dataset_"):
             suggestions_text += f"📚 (Result loaded from {result['source'].replace('_', ' ')})\n"
             if result["changes_made"]:
                 suggestions_text += f"✅ Change: '{result['original']}' → '{result['corrected']}'\n"
@@ -414,13 +940,50 @@ class EGECGrammarCorrectionBot:
                                         f"  Example: {error['error']}\n"
                                         f"  Suggested: {error['replacement'] or 'N/A'}\n\n")
                 speech_output += "\nGrammar issues were addressed."
+        return suggestions_text, speech_output
 
-        self.root.after(0, lambda: self.suggestions_text.insert(tk.END, suggestions_text))
-        self.root.after(0, lambda: self.suggestions_text.see(tk.END))
+    def on_input_changed(self, event=None):
+        if not self.live_var.get():
+            return
+        if self.live_after is not None:
+            self.root.after_cancel(self.live_after)
+        self.live_generation += 1
+        self.live_after = self.root.after(LIVE_DEBOUNCE_MS, self.start_live_correction)
 
-        self.root.after(0, lambda: self.root.update_idletasks())
-        self.speak_text(speech_output, interrupt=True, display=False)
-        self.root.after(0, self.stop_processing)
+    def start_live_correction(self):
+        self.live_after = None
+        if self.live_busy:
+            # One live correction at a time; only the latest text is corrected next.
+            self.live_rerun = True
+            return
+        text = self.text_input.get()
+        if not text.strip():
+            return
+        self.live_busy = True
+        threading.Thread(target=self._live_correction_thread, args=(text, self.live_generation), daemon=True).start()
+
+    def _live_correction_thread(self, text, generation):
+        start = time.perf_counter()
+        try:
+            result, corrected_count = correct_paragraph_incremental(text, self.live_cache, LIVE_BART_PRESET)
+        except Exception as e:
+            print(f"Live correction failed: {e}")
+            result, corrected_count = None, 0
+        elapsed = time.perf_counter() - start
+        self.root.after(0, self.finish_live_correction, generation, result, corrected_count, elapsed)
+
+    def finish_live_correction(self, generation, result, corrected_count, elapsed):
+        self.live_busy = False
+        # Results for text that has been edited again since are stale and dropped.
+        if result is not None and generation == self.live_generation:
+            suggestions_text, _ = self.describe_result(result)
+            if result.get("warning"):
+                suggestions_text = f"⚠️ {result['warning']}\n" + suggestions_text
+            self.show_result(result, suggestions_text)
+            self.status_label.config(text=f"⚡ Live: {corrected_count} changed sentence(s) corrected in {elapsed * 1000:.0f} ms")
+        if self.live_rerun:
+            self.live_rerun = False
+            self.start_live_correction()
 
     def recognize_speech(self):
         self.start_processing(self.voice_button)
@@ -447,35 +1010,56 @@ class EGECGrammarCorrectionBot:
         threading.Thread(target=recognition_task, daemon=True).start()
 
     def speak_text(self, text, interrupt=False, display=True):
-        if interrupt and self.is_speaking:
-            self.engine.stop()
-            self.speech_queue.clear()
-        
+        # Safe to call from any thread; returns as soon as the text is queued.
         if display:
-            self.suggestions_text.insert(tk.END, f"🔊 Speaking: {text}\n")
-            self.suggestions_text.see(tk.END)
-            self.root.update_idletasks()
-
-        self.engine.say(text)
-        self.engine.runAndWait()
+            self.root.after(0, lambda: self.suggestions_text.insert(tk.END, f"🔊 Speaking: {text}\n"))
+            self.root.after(0, lambda: self.suggestions_text.see(tk.END))
+        self.speech.say(text, interrupt=interrupt)
 
-    def on_speech_start(self, name):
-        self.is_speaking = True
-        self.root.config(cursor="watch")
-
-    def on_speech_end(self, name, completed):
-        self.root.config(cursor="")
-        self.is_speaking = False
-        if self.speech_queue:
-            next_text = self.speech_queue.popleft()
-            self.speak_text(next_text, display=False)
+    def on_speech_state(self, speaking):
+        self.root.config(cursor="watch" if speaking else "")
 
     def on_close(self):
-        self.engine.stop()
+        self.speech.close()
+        shutdown()
         self.root.destroy()
         os._exit(0)
 
-if __name__ == "__main__":
+def main():
+    global INFERENCE_WORKERS, PROFILE_SLOW_REQUESTS_MS, BART_BACKEND
+    parser = argparse.ArgumentParser(description="EGEC Grammar Correction Bot")
+    parser.add_argument("--batch", metavar="INPUT", help="correct a .txt (one sentence per line) or .jsonl file without the GUI")
+    parser.add_argument("--output", metavar="OUTPUT", help="write JSONL results here instead of stdout")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--bart-preset", choices=sorted(BART_PRESETS), default=BART_PRESET, help="BART decoding speed/quality trade-off")
+    parser.add_argument("--paragraphs", action="store_true", help="treat each input line as a paragraph and correct it sentence by sentence")
+    parser.add_argument("--bart-backend", choices=BACKENDS, default=BART_BACKEND, help="eager PyTorch, int8 dynamic quantization or ONNX Runtime")
+    parser.add_argument("--workers", type=int, default=INFERENCE_WORKERS, help="run BART and language detection in this many worker processes")
+    parser.add_argument("--profile-slow-ms", type=float, default=PROFILE_SLOW_REQUESTS_MS, help=f"save a cProfile trace to {PROFILE_DIR}/ for batches slower than this")
+    parser.add_argument("--startup-report", action="store_true", help="load every component and print the per-component startup times")
+    args = parser.parse_args()
+
+    INFERENCE_WORKERS = args.workers
+    BART_BACKEND = args.bart_backend
+    PROFILE_SLOW_REQUESTS_MS = args.profile_slow_ms
+    start_warmup()
+    if args.startup_report:
+        COMPONENTS.thread.join()
+        print(json.dumps(get_startup_report(), indent=4))
+        shutdown()
+        return
+
+    if args.batch:
+        run_batch(args.batch, args.output, args.batch_size, args.bart_preset, args.paragraphs)
+        shutdown()
+        return
+
+    load_tkinter()
     root = tk.Tk()
     app = EGECGrammarCorrectionBot(root)
-    root.mainloop()
\ No newline at end of file
+    root.mainloop()
+
+IMPORT_SECONDS = time.perf_counter() - IMPORT_STARTED
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
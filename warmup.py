@@ -0,0 +1,72 @@
+import time
+import threading
+from collections import OrderedDict
+
+class LazyComponents:
+    # Registry of expensive resources. get() loads a component on first use; start()
+    # loads all of them in a background thread so callers rarely have to wait. A
+    # component is loaded at most once even when get() and the warm-up race.
+    def __init__(self):
+        self.loaders = OrderedDict()
+        self.values = {}
+        self.locks = {}
+        self.timings = {}
+        self.errors = {}
+        self.current = None
+        self.thread = None
+
+    def register(self, name, loader):
+        self.loaders[name] = loader
+        self.locks[name] = threading.Lock()
+
+    def get(self, name):
+        if name in self.values:
+            return self.values[name]
+        with self.locks[name]:
+            if name not in self.values:
+                start = time.perf_counter()
+                try:
+                    self.values[name] = self.loaders[name]()
+                except Exception as e:
+                    self.errors[name] = f"{type(e).__name__}: {e}"
+                    raise
+                finally:
+                    self.timings[name] = time.perf_counter() - start
+                self.errors.pop(name, None)
+        return self.values[name]
+
+    def start(self, names=None):
+        if self.thread is not None:
+            return self.thread
+        names = list(names or self.loaders)
+        self.thread = threading.Thread(target=self._warm, args=(names,), name="warmup", daemon=True)
+        self.thread.start()
+        return self.thread
+
+    def _warm(self, names):
+        for name in names:
+            self.current = name
+            try:
+                self.get(name)
+            except Exception as e:
+                print(f"Warm-up of {name} failed: {e}")
+        self.current = None
+
+    def is_ready(self, name=None):
+        if name is not None:
+            return name in self.values
+        return all(name in self.values for name in self.loaders)
+
+    def progress(self):
+        done = sum(1 for name in self.loaders if name in self.values or name in self.errors)
+        return done, len(self.loaders), self.current
+
+    def report(self):
+        return OrderedDict(
+            (name, {
+                "status": "ready" if name in self.values else "failed" if name in self.errors else "pending",
+                "seconds": self.timings.get(name),
+                "error": self.errors.get(name),
+            })
+            for name in self.loaders
+        )